@@ -1,5 +1,11 @@
 #!/bin/bash
 
-cd /usr/lib/linkhome
-paster serve --reload development.ini
+# LINKHOME_CONFIG=development.ini runs the development profile under the
+# code reloader instead.
+CONFIG=${LINKHOME_CONFIG:-production.ini}
 
+cd /usr/lib/linkhome
+if [ "$CONFIG" = "development.ini" ]; then
+	exec paster serve --reload "$CONFIG"
+fi
+exec paster serve "$CONFIG"
@@ -0,0 +1,561 @@
+#!/usr/bin/env python
+"""Benchmark suite for the linkhome web application
+
+Drives the application through paste.fixture, or with --socket through a
+real paste.httpserver on localhost, and reports throughput, p50/p99
+latency and peak RSS for each scenario as JSON. Compare the output of two
+releases to catch regressions.
+
+The application menu is populated with synthetic desktop entries in a
+temporary directory, and the launcher is stubbed out, so no desktop
+session or linkappd is needed. The application's cache_dir (launch log,
+sessions, profiles) is moved into the same directory, so a run never
+touches the data of an installed linkhome.
+
+Usage::
+
+    python benchmark.py [--requests N] [--entries 10,100,1000]
+                        [--socket [--server production.ini] [--keepalive]
+                                  [--concurrency N]]
+                        [--startup N] [--launches N]
+                        [--output results.json]
+
+--server runs the HTTP server with the [server:main] settings (thread
+pool, keep-alive, timeouts) of the given config file, so serving profiles
+can be compared under the same load.
+
+--startup boots the application N times in fresh interpreters and times
+each boot up to its first response to /applications.
+
+--launches times N real launches with each launcher backend, from the
+launch call until the launched program runs. The D-Bus backend is
+reported as skipped when linkappd isn't running.
+
+The icon scenario also checks that serving icons writes no files, in the
+application's cache and session directories or the menu, and lists any
+it finds in its results as files_written.
+"""
+import ConfigParser
+import httplib
+import optparse
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+here_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, here_dir)
+
+import paste.fixture
+from paste.deploy import loadapp
+from paste.deploy.converters import asbool
+
+# A 1x1 transparent PNG, served as every synthetic entry's icon
+ICON = ('\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01'
+        '\x08\x06\x00\x00\x00\x1f\x15\xc4\x89\x00\x00\x00\rIDATx\x9cc\xf8\x0f'
+        '\x00\x00\x01\x01\x00\x05\x18\xd8N\x00\x00\x00\x00IEND\xaeB`\x82')
+
+DESKTOP_ENTRY = """[Desktop Entry]
+Type=Application
+Name=%(name)s
+Comment=%(comment)s
+Exec=/bin/true --entry %(n)d
+Icon=%(icon)s
+Categories=%(category)s;Benchmark;
+"""
+
+# Synthetic names and comments are made up of these, so that searches
+# match realistic numbers of entries
+SYLLABLES = ('ka', 'lo', 'mi', 'ne', 'ra', 'to', 'vu', 'xe', 'bo', 'zi', 'pla',
+             'ster', 'gram', 'vid', 'aud', 'net', 'ed', 'it', 'or', 'ium')
+CATEGORIES = ('AudioVideo', 'Game', 'Network', 'Office', 'Utility',
+              'Development', 'Graphics', 'Education', 'System', 'Settings')
+
+def synthetic_word(r):
+    return ''.join([r.choice(SYLLABLES) for i in range(r.randint(2, 4))])
+
+def populate_menu(menu_dir, count):
+    """Fills menu_dir with count synthetic desktop entries, replacing
+    whatever was there."""
+    for name in os.listdir(menu_dir):
+        os.remove(os.path.join(menu_dir, name))
+    icon_dir = os.path.join(os.path.dirname(menu_dir), 'icons')
+    if not os.path.isdir(icon_dir):
+        os.makedirs(icon_dir)
+    icon = os.path.join(icon_dir, 'bench.png')
+    f = open(icon, 'wb')
+    f.write(ICON)
+    f.close()
+    r = random.Random(count)
+    names = []
+    for n in xrange(count):
+        name = '%s %s' % (synthetic_word(r).capitalize(),
+                          synthetic_word(r).capitalize())
+        names.append(name)
+        f = open(os.path.join(menu_dir, 'app%04d.desktop' % n), 'w')
+        f.write(DESKTOP_ENTRY % dict(
+            n=n, icon=icon, name=name,
+            comment=' '.join([synthetic_word(r) for i in range(6)]),
+            category=r.choice(CATEGORIES)))
+        f.close()
+    return names
+
+def refresh_catalog():
+    """Makes the loaded application pick up a repopulated menu without
+    waiting for its next rescan."""
+    from pylons import config
+    config['pylons.g'].catalog.refresh(force=True)
+
+def search_queries(names, n=200):
+    """Returns n search queries, each the first few letters of a name."""
+    r = random.Random(n)
+    return [r.choice(names)[:r.randint(1, 8)].strip() for i in xrange(n)]
+
+def data_dirs():
+    """The directories the loaded application keeps files in."""
+    from pylons import config
+    dirs = [config['pylons.cache_dir']]
+    for key in ('beaker.session.data_dir', 'beaker.session.lock_dir'):
+        if config.get(key):
+            dirs.append(config[key])
+    return dirs
+
+def snapshot(dirs):
+    """Returns the size and mtime of every file under dirs, by path."""
+    files = {}
+    for root in dirs:
+        for (dirpath, dirnames, filenames) in os.walk(root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files[path] = (st.st_size, st.st_mtime)
+    return files
+
+def files_written(before, after):
+    """Returns the paths created, changed or removed between two
+    snapshots."""
+    paths = dict.fromkeys(before.keys() + after.keys())
+    return sorted([p for p in paths if before.get(p) != after.get(p)])
+
+def peak_rss_kb():
+    """Peak resident set size of this process so far, in kilobytes."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    return sorted_values[index]
+
+class FixtureClient(object):
+    """Issues requests straight into the WSGI stack."""
+
+    mode = 'wsgi'
+
+    def __init__(self, wsgiapp):
+        self.app = paste.fixture.TestApp(wsgiapp)
+
+    def get(self, path):
+        self.app.get(path)
+
+    def close(self):
+        pass
+
+class SocketClient(object):
+    """Issues requests over HTTP to a paste.httpserver running the app in a
+    background thread. server_options are passed on as if they came from a
+    [server:main] section; with keepalive, each client thread reuses one
+    connection."""
+
+    mode = 'socket'
+
+    def __init__(self, wsgiapp, server_options=None, keepalive=False):
+        from paste import httpserver
+        self.server = httpserver.serve(wsgiapp, host='127.0.0.1', port=0,
+                                       start_loop=False,
+                                       **serve_kwargs(server_options or {}))
+        self.host, self.port = self.server.server_address[:2]
+        self.keepalive = keepalive
+        self.local = threading.local()
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def get(self, path):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = httplib.HTTPConnection(self.host, self.port)
+            if self.keepalive:
+                self.local.conn = conn
+        response = None
+        try:
+            conn.request('GET', path)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                raise AssertionError('%s returned %d' % (path,
+                                                         response.status))
+        finally:
+            if not self.keepalive or response is None or response.will_close:
+                conn.close()
+                self.local.conn = None
+
+    def close(self):
+        self.server.server_close()
+
+def server_options(config_file):
+    """Reads the [server:main] options from a paste config file, without
+    the [DEFAULT] ones ConfigParser mixes into every section."""
+    parser = ConfigParser.RawConfigParser()
+    parser.read(os.path.join(here_dir, config_file))
+    defaults = parser.defaults()
+    return dict([(k, v) for (k, v) in parser.items('server:main')
+                 if k not in defaults and k not in ('use', 'host', 'port')])
+
+# The options egg:Paste#http takes as integers and booleans
+INT_OPTIONS = ('socket_timeout', 'threadpool_workers',
+               'threadpool_hung_thread_limit', 'threadpool_kill_thread_limit',
+               'threadpool_dying_limit', 'threadpool_spawn_if_under',
+               'threadpool_max_zombie_threads_before_die',
+               'threadpool_hung_check_period', 'threadpool_max_requests',
+               'request_queue_size')
+BOOL_OPTIONS = ('use_threadpool', 'daemon_threads')
+
+def serve_kwargs(options):
+    """Turns [server:main] options into keyword arguments for
+    paste.httpserver.serve, the way egg:Paste#http does."""
+    kwargs = {}
+    threadpool_options = {}
+    for (name, value) in options.items():
+        if name in INT_OPTIONS:
+            value = int(value)
+        elif name in BOOL_OPTIONS:
+            value = asbool(value)
+        if name.startswith('threadpool_') and name != 'threadpool_workers':
+            threadpool_options[name[len('threadpool_'):]] = value
+        else:
+            kwargs[name] = value
+    kwargs['threadpool_options'] = threadpool_options
+    return kwargs
+
+def run_scenario(client, name, paths, requests, concurrency=1):
+    """Requests each of paths in turn until requests have been made, spread
+    over concurrency threads, and returns the scenario's results."""
+    latencies = []
+    lock = threading.Lock()
+    per_thread = max(1, requests // concurrency)
+
+    def worker():
+        mine = []
+        for i in xrange(per_thread):
+            path = paths[i % len(paths)]
+            start = time.time()
+            client.get(path)
+            mine.append(time.time() - start)
+        lock.acquire()
+        try:
+            latencies.extend(mine)
+        finally:
+            lock.release()
+
+    # One untimed request, so the first-hit costs (template compilation,
+    # imports) don't land in the numbers
+    client.get(paths[0])
+
+    start = time.time()
+    if concurrency == 1:
+        worker()
+    else:
+        threads = [threading.Thread(target=worker)
+                   for i in xrange(concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    elapsed = time.time() - start
+
+    latencies.sort()
+    return dict(name=name,
+                requests=len(latencies),
+                concurrency=concurrency,
+                seconds=round(elapsed, 4),
+                throughput=round(len(latencies) / elapsed, 2),
+                p50_ms=round(percentile(latencies, 0.50) * 1000, 3),
+                p99_ms=round(percentile(latencies, 0.99) * 1000, 3),
+                peak_rss_kb=peak_rss_kb())
+
+STARTUP_SCRIPT = """
+import sys
+sys.path.insert(0, %(here)r)
+import paste.fixture
+from paste.deploy import loadapp
+from paste.deploy.converters import asbool
+app = loadapp('config:%(config)s', relative_to=%(here)r,
+              global_conf={'linkhome.menu_dir': %(menu_dir)r})
+paste.fixture.TestApp(app).get('/applications')
+"""
+
+def isolated_config(config_file, work_dir):
+    """Writes a config file to work_dir that loads config_file's
+    application with its cache_dir under work_dir, and returns its path."""
+    path = os.path.join(work_dir, 'benchmark.ini')
+    f = open(path, 'w')
+    f.write('[app:main]\nuse = config:%s\ncache_dir = %s\n' %
+            (os.path.join(here_dir, config_file),
+             os.path.join(work_dir, 'data')))
+    f.close()
+    return path
+
+def run_startup(config_file, menu_dir, runs):
+    """Times runs cold boots, from starting the interpreter to the first
+    response, and returns the results like run_scenario."""
+    script = STARTUP_SCRIPT % dict(here=here_dir, config=config_file,
+                                   menu_dir=menu_dir)
+    latencies = []
+    for i in xrange(runs):
+        start = time.time()
+        if subprocess.call([sys.executable, '-c', script]) != 0:
+            raise AssertionError('Startup run %d failed' % i)
+        latencies.append(time.time() - start)
+
+    latencies.sort()
+    return dict(name='startup_first_response',
+                requests=runs,
+                concurrency=1,
+                seconds=round(sum(latencies), 4),
+                throughput=round(runs / sum(latencies), 2),
+                p50_ms=round(percentile(latencies, 0.50) * 1000, 3),
+                p99_ms=round(percentile(latencies, 0.99) * 1000, 3),
+                peak_rss_kb=resource.getrusage(
+                    resource.RUSAGE_CHILDREN).ru_maxrss)
+
+def run_search_index(menu_dir, count, queries=2000):
+    """Times Catalog.search directly, without any HTTP around it."""
+    from linkhome.lib.catalog import Catalog
+
+    names = populate_menu(menu_dir, count)
+    catalog = Catalog(menu_dir)
+    catalog.refresh()
+
+    latencies = []
+    start = time.time()
+    for query in search_queries(names, queries):
+        t = time.time()
+        catalog.search(query)
+        latencies.append(time.time() - t)
+    elapsed = time.time() - start
+
+    latencies.sort()
+    return dict(name='search_index_%d' % count,
+                requests=len(latencies),
+                concurrency=1,
+                seconds=round(elapsed, 4),
+                throughput=round(len(latencies) / elapsed, 2),
+                p50_ms=round(percentile(latencies, 0.50) * 1000, 3),
+                p99_ms=round(percentile(latencies, 0.99) * 1000, 3),
+                peak_rss_kb=peak_rss_kb())
+
+class BenchEntry(object):
+    """Just enough of a DesktopEntry for a launcher."""
+
+    def __init__(self, command):
+        self.name = self.AppName = 'bench'
+        self.Exec = command
+
+class StubLauncher(object):
+    def launch(self, entry):
+        pass
+
+def stub_launcher():
+    """Replaces the launcher behind /applications/<app>/launch."""
+    import pylons
+    pylons.config['pylons.g'].launcher = StubLauncher()
+
+def run_launch_latency(name, launcher, work_dir, runs):
+    """Times runs launches with launcher, from the launch call until the
+    launched program (touch) has run, and returns the results like
+    run_scenario."""
+    from linkhome.lib.launcher import LaunchError
+
+    marker_dir = tempfile.mkdtemp(prefix='launched-', dir=work_dir)
+    latencies = []
+    start = time.time()
+    for i in xrange(runs):
+        marker = os.path.join(marker_dir, str(i))
+        t = time.time()
+        try:
+            launcher.launch(BenchEntry('touch %s' % marker))
+        except LaunchError, e:
+            return dict(name=name, skipped=str(e))
+        while not os.path.exists(marker):
+            if time.time() - t > 10:
+                raise AssertionError('%s: launch %d never ran' % (name, i))
+            time.sleep(0.0001)
+        latencies.append(time.time() - t)
+    elapsed = time.time() - start
+
+    latencies.sort()
+    return dict(name=name,
+                requests=runs,
+                concurrency=1,
+                seconds=round(elapsed, 4),
+                throughput=round(runs / elapsed, 2),
+                p50_ms=round(percentile(latencies, 0.50) * 1000, 3),
+                p99_ms=round(percentile(latencies, 0.99) * 1000, 3),
+                peak_rss_kb=peak_rss_kb())
+
+def load(config_file, menu_dir):
+    return loadapp('config:%s' % config_file, relative_to=here_dir,
+                   global_conf={'linkhome.menu_dir': menu_dir})
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage='%prog [options]')
+    parser.add_option('-n', '--requests', type='int', default=200,
+                      help='requests per scenario (default %default)')
+    parser.add_option('-e', '--entries', default='10,100,1000',
+                      help='menu sizes to benchmark /applications with '
+                           '(default %default)')
+    parser.add_option('-s', '--socket', action='store_true', default=False,
+                      help='go through a real HTTP server on localhost')
+    parser.add_option('-c', '--concurrency', type='int', default=1,
+                      help='client threads in socket mode (default %default)')
+    parser.add_option('--server',
+                      help='in socket mode, take the server settings from '
+                           "this config file's [server:main]")
+    parser.add_option('-k', '--keepalive', action='store_true',
+                      default=False,
+                      help='in socket mode, reuse connections')
+    parser.add_option('--startup', type='int', default=0, metavar='N',
+                      help='also time N cold boots to first response')
+    parser.add_option('--launches', type='int', default=50, metavar='N',
+                      help='real launches to time per launcher backend '
+                           '(default %default, 0 to skip)')
+    parser.add_option('-f', '--config', default='test.ini',
+                      help='paste config file to load (default %default)')
+    parser.add_option('-o', '--output',
+                      help='write the JSON report here instead of stdout')
+    options, args = parser.parse_args(argv)
+    if not options.socket and (options.concurrency > 1 or options.server or
+                               options.keepalive):
+        parser.error('--concurrency, --server and --keepalive need --socket')
+
+    work_dir = tempfile.mkdtemp(prefix='linkhome-bench-')
+    menu_dir = os.path.join(work_dir, 'menu')
+    os.makedirs(menu_dir)
+    populate_menu(menu_dir, 1)
+
+    # The controllers, and the programs a launch starts, print as they go;
+    # send all of that to stderr, and keep stdout for the report
+    sys.stdout.flush()
+    stdout = os.dup(1)
+    os.dup2(2, 1)
+    try:
+        config_file = isolated_config(options.config, work_dir)
+        wsgiapp = load(config_file, menu_dir)
+        stub_launcher()
+        if options.socket:
+            if options.server:
+                client = SocketClient(wsgiapp, server_options(options.server),
+                                      options.keepalive)
+            else:
+                client = SocketClient(wsgiapp, keepalive=options.keepalive)
+        else:
+            client = FixtureClient(wsgiapp)
+        concurrency = options.concurrency
+
+        results = []
+        try:
+            if options.startup:
+                populate_menu(menu_dir, 10)
+                results.append(run_startup(config_file, menu_dir,
+                                           options.startup))
+            for count in [int(e) for e in options.entries.split(',')]:
+                names = populate_menu(menu_dir, count)
+                refresh_catalog()
+                results.append(run_scenario(client,
+                                            'applications_%d' % count,
+                                            ['/applications'],
+                                            options.requests, concurrency))
+                results.append(run_scenario(client,
+                                            'applications_json_%d' % count,
+                                            ['/applications.json?limit=50'],
+                                            options.requests, concurrency))
+                queries = ['/applications/search?q=%s' % urllib.quote(q)
+                           for q in search_queries(names)]
+                results.append(run_scenario(client,
+                                            'applications_search_%d' % count,
+                                            queries, options.requests,
+                                            concurrency))
+            # Icons, like the rest of the menu, shouldn't touch the disk
+            # (sessions included); any file they write is listed in the report
+            before = snapshot(data_dirs() + [work_dir])
+            result = run_scenario(client, 'application_icon',
+                                  ['/applications/app0000/icon'],
+                                  options.requests, concurrency)
+            result['files_written'] = files_written(
+                before, snapshot(data_dirs() + [work_dir]))
+            if result['files_written']:
+                print >> sys.stderr, 'Icon requests wrote to %s' % \
+                    ', '.join(result['files_written'])
+            results.append(result)
+            results.append(run_scenario(client, 'application_launch',
+                                        ['/applications/app0000/launch'],
+                                        options.requests, concurrency))
+            if options.launches:
+                from linkhome.lib.launcher import DBusLauncher, LocalLauncher
+                results.append(run_launch_latency('launch_exec_dbus',
+                                                  DBusLauncher(), work_dir,
+                                                  options.launches))
+                results.append(run_launch_latency('launch_exec_local',
+                                                  LocalLauncher(), work_dir,
+                                                  options.launches))
+            results.append(run_search_index(menu_dir, 5000))
+            results.append(run_scenario(client, 'proc_index', ['/proc'],
+                                        options.requests, concurrency))
+            results.append(run_scenario(client, 'proc_get',
+                                        ['/proc/meminfo', '/proc/loadavg',
+                                         '/proc/stat', '/proc/uptime'],
+                                        options.requests, concurrency))
+            results.append(run_scenario(client, 'proc_snapshot',
+                                        ['/proc/_snapshot?files=meminfo,'
+                                         'loadavg,stat,uptime,net/dev'],
+                                        options.requests, concurrency))
+        finally:
+            client.close()
+            shutil.rmtree(work_dir, ignore_errors=True)
+    finally:
+        sys.stdout.flush()
+        os.dup2(stdout, 1)
+        os.close(stdout)
+
+    report = dict(mode=client.mode,
+                  config=options.config,
+                  server=options.server,
+                  keepalive=options.keepalive,
+                  python=sys.version.split()[0],
+                  time=int(time.time()),
+                  results=results)
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if options.output:
+        f = open(options.output, 'w')
+        f.write(text + '\n')
+        f.close()
+    else:
+        print text
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,6 @@
+import os
+
+if os.environ.get('LINKHOME_IMPORT_TIMES'):
+    # Installed before anything else is imported, so the whole boot is timed
+    from linkhome.lib.lazy import install_import_timer
+    install_import_timer()
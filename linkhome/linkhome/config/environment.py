@@ -26,6 +26,10 @@ def load_environment(global_conf, app_conf):
     config['pylons.g'] = app_globals.Globals()
     config['pylons.h'] = linkhome.lib.helpers
 
+    # Sessions come from linkhome.lib.sessions.SessionMiddleware, set up in
+    # middleware.py, rather than from Beaker's
+    config['pylons.environ_config']['session'] = 'beaker.session'
+
     # Customize templating options via this variable
     tmpl_options = config['buffet.template_options']
 
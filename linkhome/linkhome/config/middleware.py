@@ -11,6 +11,10 @@ from pylons.middleware import error_mapper, ErrorDocuments, ErrorHandler, \
 from pylons.wsgiapp import PylonsApp
 
 from linkhome.config.environment import load_environment
+from linkhome.lib.compress import GzipMiddleware
+from linkhome.lib.lazy import log_startup_report
+from linkhome.lib.metrics import MetricsMiddleware
+from linkhome.lib.sessions import SessionMiddleware
 
 def make_app(global_conf, full_stack=True, **app_conf):
     """Create a Pylons WSGI application and return it
@@ -38,6 +42,9 @@ def make_app(global_conf, full_stack=True, **app_conf):
 
     # CUSTOM MIDDLEWARE HERE (filtered by error handling middlewares)
 
+    # Lazy sessions, optionally kept in signed cookies
+    app = SessionMiddleware(app, config)
+
     if asbool(full_stack):
         # Handle Python exceptions
         app = ErrorHandler(app, global_conf, error_template=error_template,
@@ -54,4 +61,13 @@ def make_app(global_conf, full_stack=True, **app_conf):
     javascripts_app = StaticJavascripts()
     static_app = StaticURLParser(config['pylons.paths']['static_files'])
     app = Cascade([static_app, javascripts_app, app])
+
+    # Compress text responses, static files included
+    app = GzipMiddleware(app, config)
+
+    # Time everything, static files included, and serve /_metrics
+    app = MetricsMiddleware(app, config)
+
+    # Only reports anything when LINKHOME_IMPORT_TIMES is set
+    log_startup_report()
     return app
@@ -20,9 +20,12 @@ def make_map():
     map.connect('error/:action/:id', controller='error')
     
     map.connect('/proc', controller='procfs', action='index')
+    map.connect('/proc/_snapshot', controller='procfs', action='snapshot')
     map.connect('/proc/:id', controller='procfs', action='get')
 
     map.connect('/applications', controller='applications', action='index')
+    map.connect('/applications.json', controller='applications', action='catalog')
+    map.connect('/applications/search', controller='applications', action='search')
     map.connect('/applications/:id', controller='applications', action='get')
     map.connect('/applications/:app/:prop', controller='applications', action='properties')
 
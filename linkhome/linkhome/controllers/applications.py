@@ -1,74 +1,88 @@
 import logging
-import os
-import subprocess
 import mimetypes
-import dbus
-
-class DesktopEntry:
-	def Import(self, path, name):
-		self.name = name.partition(".")[0].strip()
-		self.fname = name.strip()
-		self.fullpath = os.path.join(path,name).strip()
-		self.Comment = "No Information.."
-		self.Icon = "/applications/icons/default-icon.png"
-
-	        f = open(os.path.join(path,name), 'r')
-		for line in f:
-                	if line.startswith("Exec="):
-                        	self.Exec = line.partition("=")[2].strip()
-			if line.startswith("Name="):
-				self.AppName = line.partition("=")[2].strip()
-
-			if line.startswith("Comment="):
-				self.Comment = line.partition("=")[2].strip()
-
-			if line.startswith("Icon="):
-				self.Icon = line.partition("=")[2].strip()
-		f.close()		
+import os
+
+from linkhome.lib.lazy import lazy_import
+
+# Only needed for the JSON catalog and search
+simplejson = lazy_import('simplejson')
 
 from linkhome.lib.base import *
+from linkhome.lib.launcher import LaunchError
 
 log = logging.getLogger(__name__)
 
+def _limit(default, maximum=500):
+	"""Reads ?limit=, keeping it within 1..maximum"""
+	try:
+		limit = int(request.params.get('limit', default))
+	except ValueError:
+		abort(400)
+	return max(1, min(limit, maximum))
+
+def _json(data):
+	response.headers['Content-Type'] = 'application/json'
+	return simplejson.dumps(data)
+
 class ApplicationsController(BaseController):
     
 	def index(self):
-		paths = filter(lambda p: os.path.isfile(os.path.join('/usr/share/linkhome', p)),
-		                       os.listdir('/usr/share/linkhome'))
-		paths.sort()
-
-		list = []
-		for file in paths:
-			entry = DesktopEntry()
-			entry.Import('/usr/share/linkhome',file)
-			list.append(entry)
-
-		return render('/applications/index.mako', files = list)
+		entries = g.catalog.entries()
+		if config.get('linkhome.menu_order', 'usage') == 'usage':
+			entries = g.launches.rank(entries)
+		if g.prewarmer:
+			top = int(config.get('linkhome.prewarm_top', 3))
+			g.prewarmer.prewarm([e.Exec for e in entries[:top]
+			                     if hasattr(e, 'Exec')])
+		return render('/applications/index.mako', files = entries,
+		              prewarm = g.prewarmer is not None)
+
+	def catalog(self):
+		"""One page of the catalog. Pass the returned cursor back as ?cursor=
+		for the next page; it is null on the last one."""
+		entries, cursor = g.catalog.page(request.params.get('cursor'), _limit(50))
+		return _json(dict(entries = [e.serialize() for e in entries],
+		                  cursor = cursor))
+
+	def search(self):
+		"""Entries matching ?q=, best matches first"""
+		query = request.params.get('q', '')
+		entries = g.catalog.search(query, _limit(20))
+		return _json(dict(query = query,
+		                  entries = [e.serialize() for e in entries]))
 
 	def properties(self, app, prop):
-		entry = DesktopEntry()
-		entry.Import('/usr/share/linkhome',app.strip() + '.desktop')
+		entry = g.catalog.get(app.strip())
+		if entry is None:
+			abort(404)
 		print 'Running Properties '  + app + " " + prop
 		print 'File Name: ' + entry.fname
 
 		if prop.strip() == 'icon':
 			print "Found The Icon! "
-			f = open(entry.Icon,'r')
-			data = f.read()
-			f.close
-			response.headers['Content-type'] = mimetypes.guess_type(entry.Icon)
+			data = read_file(entry.Icon)
+			response.headers['Content-type'] = mimetypes.guess_type(entry.Icon)[0]
 			return data
 
 		elif prop.strip() == 'launch':
 			print "Launch is run! " + prop.strip() + " " + prop
 			
-			session_bus = dbus.SessionBus()
-				
-			obj = session_bus.get_object('tv.neuros.LinkHome','/LinkHome')
-			obj.AppStart(entry.Exec,dbus_interface='tv.neuros.LinkHome')
+			try:
+				g.launcher.launch(entry)
+			except LaunchError, e:
+				log.error('Cannot launch %s: %s', entry.name, e)
+				abort(503)
+			g.launches.record(entry.name)
 
 			return render('/applications/launched.mako', application = entry)
 
+		elif prop.strip() == 'prewarm':
+			# Sent when the entry gets focus in the menu
+			if g.prewarmer and hasattr(entry, 'Exec'):
+				g.prewarmer.prewarm([entry.Exec])
+			response.status_code = 204
+			return ''
+
 		elif prop.strip() == 'info':
 
 			return render('/application/launched.mako', application = entry)
@@ -1,11 +1,23 @@
 import logging
 import os
+import re
 
+from linkhome.lib.lazy import lazy_import
+
+simplejson = lazy_import('simplejson')
 
 from linkhome.lib.base import *
+from linkhome.lib.procfs import NESTED
 
 log = logging.getLogger(__name__)
 
+# Most files one snapshot may ask for
+MAX_SNAPSHOT = 32
+
+# The names X-Snapshot-Errors may echo. Anything else, like a name with a
+# CR or LF in it, could split the header.
+_header_safe = re.compile(r'^[\w.+-]+$')
+
 class ProcfsController(BaseController):
     
     def index(self):
@@ -16,8 +28,45 @@ class ProcfsController(BaseController):
 
     def get(self, id):
         fname = os.path.join('/proc', id)
-        f = open(fname, 'r')
-        text = f.read()
-        f.close()
+        text = read_file(fname)
         return render('/procfs/file.mako', filename = fname, contents = text)
+
+    def snapshot(self):
+        """Returns several files read at one instant, e.g.
+        ``/proc/_snapshot?files=meminfo,loadavg,net/dev``, as JSON, or as
+        multipart/mixed with one text/plain part per file if format is
+        multipart. The monotonic time of the reading is in X-Monotonic."""
+        files = request.params.get('files', '').encode('utf-8')
+        names = [n.strip() for n in files.split(',') if n.strip()]
+        if not names or len(names) > MAX_SNAPSHOT:
+            abort(400)
+        start, elapsed, files, errors = g.procfs.snapshot(names)
+
+        response.headers['X-Monotonic'] = '%.6f' % start
+        if request.params.get('format') == 'multipart':
+            return self._multipart(names, files, errors)
+
+        response.headers['Content-Type'] = 'application/json'
+        for name in files:
+            files[name] = files[name].decode('utf-8', 'replace')
+        return simplejson.dumps(dict(monotonic=start, elapsed=elapsed,
+                                     files=files, errors=errors),
+                                separators=(',', ':'))
+
+    def _multipart(self, names, files, errors):
+        boundary = os.urandom(12).encode('hex')
+        response.headers['Content-Type'] = \
+            'multipart/mixed; boundary=%s' % boundary
+        reported = [name for name in sorted(errors)
+                    if name in NESTED or _header_safe.match(name)]
+        if reported:
+            response.headers['X-Snapshot-Errors'] = ','.join(reported)
+        parts = []
+        for name in names:
+            if name in files:
+                parts.append('--%s\r\nContent-Type: text/plain\r\n'
+                             'Content-Location: /proc/%s\r\n\r\n%s\r\n' %
+                             (boundary, name, files[name]))
+        parts.append('--%s--\r\n' % boundary)
+        return ''.join(parts)
             
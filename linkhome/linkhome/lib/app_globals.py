@@ -1,6 +1,15 @@
 """The application's Globals object"""
+import os
+
+from paste.deploy.converters import asbool
 from pylons import config
 
+from linkhome.lib.catalog import Catalog
+from linkhome.lib.launcher import make_launcher
+from linkhome.lib.launchlog import LaunchLog
+from linkhome.lib.prewarm import Prewarmer
+from linkhome.lib.procfs import ProcReader
+
 class Globals(object):
     """Globals acts as a container for objects available throughout the
     life of the application
@@ -11,4 +20,16 @@ class Globals(object):
         initialization and is available during requests via the 'g'
         variable
         """
-        pass
+        self.catalog = Catalog(config.get('linkhome.menu_dir',
+                                          '/usr/share/linkhome'),
+                               int(config.get('linkhome.menu_rescan', 5)))
+        half_life = float(config.get('linkhome.launch_half_life', 14))
+        self.launches = LaunchLog(os.path.join(config['pylons.cache_dir'],
+                                               'launches.log'),
+                                  half_life=half_life * 24 * 3600)
+        self.prewarmer = None
+        if asbool(config.get('linkhome.prewarm', False)):
+            budget = int(config.get('linkhome.prewarm_budget', 64))
+            self.prewarmer = Prewarmer(budget=budget * 1024 * 1024)
+        self.procfs = ProcReader('/proc')
+        self.launcher = make_launcher(config.get('linkhome.launcher', 'auto'))
@@ -8,19 +8,45 @@ from pylons.controllers import WSGIController
 from pylons.controllers.util import abort, etag_cache, redirect_to
 from pylons.decorators import jsonify, validate
 from pylons.i18n import _, ungettext, N_
-from pylons.templating import render
+from pylons.templating import render as _render
+
+import time
 
 import linkhome.lib.helpers as h
+import linkhome.lib.metrics as metrics
 import linkhome.model as model
 
+@metrics.timed('render')
+def render(*args, **kwargs):
+    """Render a template, recording how long it took"""
+    return _render(*args, **kwargs)
+
+@metrics.timed('file')
+def read_file(fname):
+    """Return the contents of fname, recording how long reading it took"""
+    f = open(fname, 'r')
+    text = f.read()
+    f.close()
+    return text
+
 class BaseController(WSGIController):
 
     def __call__(self, environ, start_response):
         """Invoke the Controller"""
+        # Everything between MetricsMiddleware and here is routing and
+        # controller lookup
+        start = time.time()
+        if metrics.START_KEY in environ:
+            metrics.observe('routing', start - environ[metrics.START_KEY],
+                            environ)
+
         # WSGIController.__call__ dispatches to the Controller method
         # the request is routed to. This routing information is
         # available in environ['pylons.routes_dict']
-        return WSGIController.__call__(self, environ, start_response)
+        try:
+            return WSGIController.__call__(self, environ, start_response)
+        finally:
+            metrics.observe('action', time.time() - start, environ)
 
 # Include the '_' function in the public names
 __all__ = [__name for __name in locals().keys() if not __name.startswith('_') \
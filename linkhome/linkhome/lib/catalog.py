@@ -0,0 +1,296 @@
+"""The application catalog
+
+Keeps the parsed desktop entries of the application menu in memory, along
+with a search index over their names, comments and categories. The menu
+directory is rescanned at most every ``rescan_interval`` seconds, and
+only entries whose files changed are re-parsed and re-indexed. Only
+``*.desktop`` files are entries, named after their file without the
+suffix.
+
+Searching matches each query term against the indexed words. Terms of
+one or two characters match the start of a word, through sets kept for
+every such prefix; longer terms match anywhere in a word, through a
+trigram index. Entries must match every term. All of the index is
+updated entry by entry, so a rescan costs nothing for unchanged files.
+"""
+import bisect
+import logging
+import os
+import re
+import threading
+import time
+
+import linkhome.lib.metrics as metrics
+
+log = logging.getLogger(__name__)
+
+_words = re.compile(r'\w+', re.UNICODE)
+_SUFFIX = '.desktop'
+_empty = frozenset()
+
+class DesktopEntry:
+    @metrics.timed('file')
+    def Import(self, path, name):
+        self.name = name[:-len(_SUFFIX)]
+        self.fname = name.strip()
+        self.fullpath = os.path.join(path,name).strip()
+        self.AppName = self.name
+        self.Comment = "No Information.."
+        self.Icon = "/applications/icons/default-icon.png"
+        self.Categories = []
+
+        f = open(os.path.join(path,name), 'r')
+        for line in f:
+            if line.startswith("Exec="):
+                self.Exec = line.partition("=")[2].strip()
+            if line.startswith("Name="):
+                self.AppName = line.partition("=")[2].strip()
+
+            if line.startswith("Comment="):
+                self.Comment = line.partition("=")[2].strip()
+
+            if line.startswith("Icon="):
+                self.Icon = line.partition("=")[2].strip()
+
+            if line.startswith("Categories="):
+                self.Categories = [c for c in
+                                   line.partition("=")[2].strip().split(';')
+                                   if c]
+        f.close()
+
+    def serialize(self):
+        """Returns the entry as a JSON-compatible dict."""
+        return dict(name=self.name,
+                    AppName=self.AppName,
+                    Comment=self.Comment,
+                    Categories=self.Categories,
+                    icon='/applications/%s/icon' % self.name,
+                    launch='/applications/%s/launch' % self.name)
+
+def _trigrams(word):
+    return [word[i:i + 3] for i in range(len(word) - 2)]
+
+def _keys(words):
+    """Returns the index keys for a list of words: the one and two character
+    prefixes of each, and all of their trigrams. Keys of different lengths
+    can't collide, so they share one dict."""
+    keys = {}
+    for word in words:
+        keys[word[:1]] = True
+        keys[word[:2]] = True
+        for trigram in _trigrams(word):
+            keys[trigram] = True
+    return keys
+
+def _intersect(sets):
+    """Intersects a list of sets, smallest first."""
+    sets = sorted(sets, key=len)
+    result = sets[0]
+    for s in sets[1:]:
+        if not result:
+            break
+        result = result & s
+    return result
+
+class Catalog(object):
+    """The desktop entries in menu_dir, indexed for paging and search."""
+
+    def __init__(self, menu_dir, rescan_interval=5):
+        self.menu_dir = menu_dir
+        self.rescan_interval = rescan_interval
+        self._lock = threading.RLock()
+        self._scanned = None
+
+        self._entries = {}      # name -> DesktopEntry
+        self._mtimes = {}       # name -> mtime of its file
+        self._names = []        # sorted entry names, for paging
+        self._by_app = []       # sorted (lowercased AppName, name)
+        self._order = None      # name -> position in _by_app, built lazily
+        self._text = {}         # name -> lowercased searchable words
+        self._index = {}        # prefix or trigram -> set of names
+
+    def refresh(self, force=False):
+        """Brings the catalog up to date with menu_dir, unless it was
+        already checked within the last rescan_interval seconds."""
+        now = time.time()
+        if not force and self._scanned is not None and \
+           now - self._scanned < self.rescan_interval:
+            return
+
+        self._lock.acquire()
+        try:
+            self._scanned = now
+            seen = {}
+            try:
+                files = os.listdir(self.menu_dir)
+            except OSError, e:
+                log.warn('Cannot read menu directory %s: %s', self.menu_dir,
+                         e)
+                files = []
+
+            for fname in files:
+                if not fname.endswith(_SUFFIX):
+                    continue
+                path = os.path.join(self.menu_dir, fname)
+                try:
+                    mtime = os.stat(path).st_mtime
+                except OSError:
+                    continue
+                if not os.path.isfile(path):
+                    continue
+                name = fname[:-len(_SUFFIX)]
+                seen[name] = True
+                if self._mtimes.get(name) == mtime:
+                    continue
+
+                entry = DesktopEntry()
+                try:
+                    entry.Import(self.menu_dir, fname)
+                except IOError, e:
+                    log.warn('Cannot read desktop entry %s: %s', path, e)
+                    continue
+                self._remove(name)
+                self._add(entry, mtime)
+
+            for name in [n for n in self._entries if n not in seen]:
+                self._remove(name)
+        finally:
+            self._lock.release()
+
+    def _add(self, entry, mtime):
+        name = entry.name
+        self._entries[name] = entry
+        self._mtimes[name] = mtime
+        bisect.insort(self._names, name)
+
+        app_key = entry.AppName.decode('utf-8', 'replace').lower()
+        bisect.insort(self._by_app, (app_key, name))
+        self._order = None
+
+        text = ' '.join([entry.AppName, entry.Comment] + entry.Categories)
+        words = _words.findall(text.decode('utf-8', 'replace').lower())
+        self._text[name] = ' '.join(words)
+        for key in _keys(words):
+            self._index.setdefault(key, set()).add(name)
+
+    def _remove(self, name):
+        if name not in self._entries:
+            return
+        entry = self._entries.pop(name)
+        del self._mtimes[name]
+        del self._names[bisect.bisect_left(self._names, name)]
+
+        app_key = entry.AppName.decode('utf-8', 'replace').lower()
+        del self._by_app[bisect.bisect_left(self._by_app, (app_key, name))]
+        self._order = None
+
+        for key in _keys(self._text.pop(name).split()):
+            names = self._index[key]
+            names.discard(name)
+            if not names:
+                del self._index[key]
+
+    def get(self, name):
+        """Returns the entry called name, or None."""
+        self.refresh()
+        return self._entries.get(name)
+
+    def entries(self):
+        """Returns every entry, sorted by name."""
+        self.refresh()
+        self._lock.acquire()
+        try:
+            return [self._entries[n] for n in self._names]
+        finally:
+            self._lock.release()
+
+    def page(self, cursor=None, limit=50):
+        """Returns up to limit entries, sorted by name, starting after the
+        entry named cursor, and the cursor for the following page (None on
+        the last page)."""
+        self.refresh()
+        self._lock.acquire()
+        try:
+            start = 0
+            if cursor:
+                start = bisect.bisect_right(self._names, cursor)
+            names = self._names[start:start + limit]
+            more = start + limit < len(self._names)
+            entries = [self._entries[n] for n in names]
+        finally:
+            self._lock.release()
+
+        if more and names:
+            return entries, names[-1]
+        return entries, None
+
+    def _candidates(self, term):
+        """Returns a superset of the names matching a single lowercased
+        term. Terms longer than three characters can share every trigram
+        with a word without being in it, so their matches need checking
+        against the text."""
+        if len(term) < 3:
+            return self._index.get(term, _empty)
+        return _intersect([self._index.get(t, _empty)
+                           for t in _trigrams(term)])
+
+    def _ordered(self, names, count, match):
+        """Returns the first count of names that match, in AppName order."""
+        if self._order is None:
+            self._order = dict([(n, i) for (i, (k, n))
+                                in enumerate(self._by_app)])
+        if len(names) * 8 < len(self._by_app):
+            ordered = sorted(names, key=self._order.get)
+        else:
+            # Dense: cheaper to walk the whole catalog in order
+            ordered = [n for (k, n) in self._by_app]
+
+        found = []
+        for n in ordered:
+            if n in names and match(n):
+                found.append(n)
+                if len(found) == count:
+                    break
+        return found
+
+    def search(self, query, limit=20):
+        """Returns up to limit entries matching every term in query. Entries
+        whose AppName starts with the query come first, then the rest, each
+        sorted by AppName."""
+        self.refresh()
+        if not isinstance(query, unicode):
+            query = query.decode('utf-8', 'replace')
+        terms = _words.findall(query.lower())
+        if not terms:
+            return []
+
+        unchecked = [t for t in terms if len(t) > 3]
+        text = self._text
+        def match(name):
+            for term in unchecked:
+                if term not in text[name]:
+                    return False
+            return True
+
+        self._lock.acquire()
+        try:
+            names = _intersect([self._candidates(t) for t in terms])
+            if not names:
+                return []
+
+            query = ' '.join(terms)
+            start = bisect.bisect_left(self._by_app, (query,))
+            end = bisect.bisect_left(self._by_app, (query + u'\uffff',))
+            first = []
+            for (k, n) in self._by_app[start:end]:
+                if n in names and match(n):
+                    first.append(n)
+                    if len(first) == limit:
+                        break
+
+            if len(first) < limit:
+                rest = names.difference(first)
+                first.extend(self._ordered(rest, limit - len(first), match))
+            return [self._entries[n] for n in first]
+        finally:
+            self._lock.release()
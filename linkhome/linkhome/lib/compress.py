@@ -0,0 +1,288 @@
+"""Response compression
+
+GzipMiddleware gzips text responses (the menu, /proc listings, procfs
+dumps, JSON) for clients that send ``Accept-Encoding: gzip``. It works
+chunk by chunk: every chunk the application yields is compressed and
+flushed as soon as it arrives, so streamed responses keep streaming.
+Types that are already compressed, such as PNG icons, are left alone.
+
+A static file with a ``.gz`` sibling that's at least as new, e.g.
+``public/js/menu.js.gz``, is served straight from the sibling to clients
+that accept gzip, without compressing anything per request. Only files of
+the types that would be compressed get this.
+
+The ``/_metrics`` page gets counters for the bytes going in and out of
+the compressor, whose ratio is the compression ratio, and the CPU time
+spent compressing.
+"""
+import logging
+import mimetypes
+import os
+import resource
+import struct
+import time
+import zlib
+
+from paste.deploy.converters import aslist
+from paste.fileapp import FileApp
+
+import linkhome.lib.metrics as metrics
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TYPES = ('text/html text/plain text/css text/xml text/javascript '
+                 'application/javascript application/x-javascript '
+                 'application/json application/xml image/svg+xml')
+
+# gzip member header: magic, deflate, no flags, no mtime, no extra flags,
+# unknown OS
+GZIP_HEADER = '\037\213\010\000\000\000\000\000\000\377'
+
+input_bytes = metrics.registry.counter(
+    'linkhome_gzip_input_bytes_total',
+    'Bytes of response bodies before compression.')
+output_bytes = metrics.registry.counter(
+    'linkhome_gzip_output_bytes_total',
+    'Bytes of response bodies after compression.')
+cpu_seconds = metrics.registry.counter(
+    'linkhome_gzip_cpu_seconds_total',
+    'CPU time spent compressing response bodies.')
+responses = metrics.registry.counter(
+    'linkhome_gzip_responses_total',
+    'Responses compressed on the fly.')
+precomputed = metrics.registry.counter(
+    'linkhome_gzip_precomputed_total',
+    'Responses served from a precomputed .gz file.')
+
+RUSAGE_THREAD = getattr(resource, 'RUSAGE_THREAD', 1)
+
+def _thread_cpu():
+    usage = resource.getrusage(RUSAGE_THREAD)
+    return usage.ru_utime + usage.ru_stime
+
+try:
+    _thread_cpu()
+except (ValueError, resource.error):
+    # No per-thread usage on this platform; fall back to the process's
+    _thread_cpu = time.clock
+
+def accepts_gzip(accept_encoding):
+    """Returns whether an Accept-Encoding header allows gzip."""
+    star = False
+    for item in accept_encoding.lower().split(','):
+        params = item.split(';')
+        coding = params[0].strip()
+        q = 1.0
+        for param in params[1:]:
+            param = param.strip()
+            if param.startswith('q='):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if coding in ('gzip', 'x-gzip'):
+            return q > 0
+        if coding == '*':
+            star = q > 0
+    return star
+
+def _header(headers, name):
+    for (key, value) in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+class _Compressor(object):
+    """Turns the chunks of one response body into a gzip stream."""
+
+    def __init__(self, level):
+        self.zobj = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self.crc = zlib.crc32('')
+        self.size = 0
+        self.compressed = 0
+        self.cpu = 0.0
+        self.started = False
+        self.finished = False
+
+    def compress(self, data):
+        """Returns data compressed and flushed, so the client can decode
+        everything sent so far."""
+        if not data:
+            return ''
+        start = _thread_cpu()
+        out = self.zobj.compress(data) + self.zobj.flush(zlib.Z_SYNC_FLUSH)
+        self.crc = zlib.crc32(data, self.crc)
+        self.size += len(data)
+        if not self.started:
+            self.started = True
+            out = GZIP_HEADER + out
+        self.cpu += _thread_cpu() - start
+        self.compressed += len(out)
+        return out
+
+    def finish(self):
+        """Returns the end of the gzip stream, and updates the counters."""
+        start = _thread_cpu()
+        out = self.zobj.flush() + struct.pack('<LL', self.crc & 0xffffffffL,
+                                              self.size & 0xffffffffL)
+        if not self.started:
+            self.started = True
+            out = GZIP_HEADER + out
+        self.cpu += _thread_cpu() - start
+        self.compressed += len(out)
+        self.count()
+        return out
+
+    def count(self):
+        if self.finished:
+            return
+        self.finished = True
+        input_bytes.inc(self.size)
+        output_bytes.inc(self.compressed)
+        cpu_seconds.inc(self.cpu)
+        responses.inc()
+
+class _GzipIterable(object):
+    """Compresses an app_iter once start_response has decided to."""
+
+    def __init__(self, app_iter, state):
+        self.app_iter = app_iter
+        self.state = state
+
+    def __iter__(self):
+        for chunk in self.app_iter:
+            compressor = self.state.get('compressor')
+            if compressor is None:
+                yield chunk
+            else:
+                yield compressor.compress(chunk)
+        compressor = self.state.get('compressor')
+        if compressor is not None:
+            yield compressor.finish()
+
+    def close(self):
+        try:
+            if hasattr(self.app_iter, 'close'):
+                self.app_iter.close()
+        finally:
+            # Count what was compressed even if the client went away
+            compressor = self.state.get('compressor')
+            if compressor is not None:
+                compressor.count()
+
+class GzipMiddleware(object):
+    """Compresses responses for clients that accept gzip.
+
+    Options, read from the application config:
+
+    ``compress.level``
+        zlib compression level, from 1 (fastest) to 9 (smallest), or 0 to
+        turn compression off. Defaults to 6.
+
+    ``compress.min_length``
+        Responses with a shorter Content-Length aren't compressed.
+        Defaults to 256.
+
+    ``compress.types``
+        The content types to compress. Defaults to the common text types.
+    """
+
+    def __init__(self, app, config):
+        self.app = app
+        self.level = int(config.get('compress.level', 6))
+        self.min_length = int(config.get('compress.min_length', 256))
+        self.types = dict.fromkeys(aslist(config.get('compress.types',
+                                                     DEFAULT_TYPES)))
+        self.static_dir = None
+        static_dir = config.get('pylons.paths', {}).get('static_files')
+        if static_dir:
+            self.static_dir = os.path.abspath(static_dir)
+
+    def __call__(self, environ, start_response):
+        method = environ.get('REQUEST_METHOD')
+        gzip = self.level and \
+               accepts_gzip(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        if gzip and method in ('GET', 'HEAD') and self.static_dir:
+            variant = self._precomputed(environ.get('PATH_INFO', ''))
+            if variant is not None:
+                precomputed.inc()
+                return FileApp(variant, [('Vary', 'Accept-Encoding')])(
+                    environ, start_response)
+        # Nothing to send a compressed body in
+        gzip = gzip and method != 'HEAD'
+
+        state = {}
+        def gzip_start_response(status, headers, exc_info=None):
+            content_type = _header(headers, 'content-type') or ''
+            if content_type.split(';')[0].strip().lower() in self.types:
+                headers = self._vary(headers)
+                if gzip and self._worthwhile(status, headers):
+                    headers = self._encoded(headers)
+                    state['compressor'] = _Compressor(self.level)
+            write = start_response(status, headers, exc_info)
+            if 'compressor' not in state:
+                return write
+            compressor = state['compressor']
+            def gzip_write(data):
+                write(compressor.compress(data))
+            return gzip_write
+
+        return _GzipIterable(self.app(environ, gzip_start_response), state)
+
+    def _precomputed(self, path_info):
+        """Returns the .gz sibling of the static file at path_info, if it
+        is of a type to compress and has an up to date one."""
+        if not path_info or path_info.endswith('/'):
+            return None
+        if mimetypes.guess_type(path_info)[0] not in self.types:
+            return None
+        path = os.path.normpath(os.path.join(self.static_dir,
+                                             path_info.lstrip('/')))
+        if not path.startswith(self.static_dir + os.sep):
+            return None
+        try:
+            variant = os.stat(path + '.gz')
+            original = os.stat(path)
+        except OSError:
+            return None
+        if variant.st_mtime < original.st_mtime:
+            log.debug('Ignoring stale %s.gz', path)
+            return None
+        return path + '.gz'
+
+    def _worthwhile(self, status, headers):
+        if status[:3] in ('204', '206', '304'):
+            return False
+        if _header(headers, 'content-encoding'):
+            return False
+        length = _header(headers, 'content-length')
+        if length is not None:
+            try:
+                return int(length) >= self.min_length
+            except ValueError:
+                pass
+        return True
+
+    def _vary(self, headers):
+        vary = _header(headers, 'vary')
+        if vary is None:
+            return list(headers) + [('Vary', 'Accept-Encoding')]
+        if 'accept-encoding' in vary.lower() or vary.strip() == '*':
+            return headers
+        return [(k, v) for (k, v) in headers if k.lower() != 'vary'] + \
+               [('Vary', vary + ', Accept-Encoding')]
+
+    def _encoded(self, headers):
+        """Returns headers for the compressed version of a response."""
+        encoded = []
+        for (key, value) in headers:
+            name = key.lower()
+            if name in ('content-length', 'content-range', 'accept-ranges'):
+                # These count uncompressed bytes
+                continue
+            if name == 'etag' and value.endswith('"'):
+                # The compressed body is a different entity
+                value = value[:-1] + '-gzip"'
+            encoded.append((key, value))
+        encoded.append(('Content-Encoding', 'gzip'))
+        return encoded
@@ -0,0 +1,340 @@
+"""Application launchers
+
+A launcher starts the application behind a menu entry: its
+``launch(entry)`` starts the application of a DesktopEntry, or raises
+LaunchError. Which one the menu uses is set by ``linkhome.launcher``:
+
+``dbus``
+    Asks linkappd to start it, over D-Bus.
+
+``local``
+    Starts it from a spawn helper: a small process forked when the
+    application loads, before the server starts any threads.
+
+``auto``
+    Tries D-Bus and falls back to the spawn helper when linkappd isn't
+    running. The default.
+
+The spawn helper gets requests over a Unix socket pair. It expands the
+field codes of the entry's Exec line and starts the program with
+``posix_spawnp`` (through ctypes; fork and exec where that's missing), in
+a process group of its own and with default signal handling. It tracks
+the programs it started and reaps them on SIGCHLD. The helper exits when
+the web application does; the programs it started keep running.
+
+A helper that dies isn't restarted, since forking again would happen on a
+request thread. Its launches raise LaunchError from then on, and
+``auto`` is left with D-Bus.
+"""
+import errno
+import fcntl
+import logging
+import os
+import re
+import shlex
+import signal
+import socket
+import struct
+import threading
+
+import linkhome.lib.metrics as metrics
+from linkhome.lib.lazy import lazy_import
+
+dbus = lazy_import('dbus')
+
+log = logging.getLogger(__name__)
+
+POSIX_SPAWN_SETPGROUP = 0x02
+POSIX_SPAWN_SETSIGDEF = 0x04
+POSIX_SPAWN_SETSIGMASK = 0x08
+
+# Python ignores these, and ignored signals stay ignored across exec
+_DEFAULT_SIGNALS = [getattr(signal, name) for name in ('SIGPIPE', 'SIGXFSZ')
+                    if hasattr(signal, name)]
+
+_field_code = re.compile('%(.)')
+_LENGTH = struct.Struct('!I')
+
+class LaunchError(Exception):
+    """The application couldn't be started."""
+
+def expand_exec(command, name='', icon='', location=''):
+    """Splits an Exec line into arguments and expands its field codes, as
+    the desktop entry spec describes. Launches from the menu have no files
+    or URLs, so %f, %F, %u and %U expand to nothing."""
+    try:
+        args = shlex.split(command)
+    except ValueError, e:
+        raise LaunchError('Bad Exec line %r: %s' % (command, e))
+    values = {'%': '%', 'c': name, 'k': location}
+    expanded = []
+    for arg in args:
+        if arg == '%i':
+            if icon:
+                expanded.extend(['--icon', icon])
+            continue
+        value = _field_code.sub(lambda m: values.get(m.group(1), ''), arg)
+        if value or not arg:
+            expanded.append(value)
+    return expanded
+
+def _cloexec(fd):
+    flags = fcntl.fcntl(fd, fcntl.F_GETFD)
+    fcntl.fcntl(fd, fcntl.F_SETFD, flags | fcntl.FD_CLOEXEC)
+
+def _send(sock, *fields):
+    payload = '\0'.join(fields)
+    sock.sendall(_LENGTH.pack(len(payload)) + payload)
+
+def _recv_exactly(sock, size):
+    data = ''
+    while len(data) < size:
+        try:
+            chunk = sock.recv(size - len(data))
+        except socket.error, e:
+            if e.args[0] == errno.EINTR:
+                # A SIGCHLD; its handler has run by now
+                continue
+            raise
+        if not chunk:
+            raise EOFError('Connection closed')
+        data += chunk
+    return data
+
+def _recv(sock):
+    size = _LENGTH.unpack(_recv_exactly(sock, _LENGTH.size))[0]
+    return _recv_exactly(sock, size).split('\0')
+
+def _load_posix_spawn():
+    """Returns a function starting argv with libc's posix_spawnp, through
+    ctypes, and returning its pid; or None."""
+    try:
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library('c'))
+        posix_spawnp = libc.posix_spawnp
+    except (ImportError, OSError, AttributeError), e:
+        log.info('posix_spawn unavailable, using fork and exec: %s', e)
+        return None
+
+    # posix_spawnattr_t and sigset_t are opaque; these are comfortably
+    # bigger than glibc's
+    attr = ctypes.create_string_buffer(1024)
+    mask = ctypes.create_string_buffer(256)
+    defaults = ctypes.create_string_buffer(256)
+    libc.posix_spawnattr_init(attr)
+    libc.sigemptyset(mask)
+    libc.sigemptyset(defaults)
+    for sig in _DEFAULT_SIGNALS:
+        libc.sigaddset(defaults, sig)
+    libc.posix_spawnattr_setsigmask(attr, mask)
+    libc.posix_spawnattr_setsigdefault(attr, defaults)
+    libc.posix_spawnattr_setpgroup(attr, 0)
+    libc.posix_spawnattr_setflags(attr, ctypes.c_short(
+        POSIX_SPAWN_SETPGROUP | POSIX_SPAWN_SETSIGDEF |
+        POSIX_SPAWN_SETSIGMASK))
+
+    def spawn(argv):
+        c_argv = (ctypes.c_char_p * (len(argv) + 1))(*(argv + [None]))
+        env = ['%s=%s' % item for item in os.environ.items()]
+        c_env = (ctypes.c_char_p * (len(env) + 1))(*(env + [None]))
+        pid = ctypes.c_int()
+        err = posix_spawnp(ctypes.byref(pid), argv[0], None, attr, c_argv,
+                           c_env)
+        if err:
+            raise OSError(err, '%s: %s' % (argv[0], os.strerror(err)))
+        return pid.value
+    return spawn
+
+def _fork_exec(argv):
+    """Starts argv with fork and exec. Returns its pid, or raises OSError
+    if it couldn't be executed."""
+    # The child reports a failed exec through the pipe; on success, exec
+    # closes it
+    r, w = os.pipe()
+    _cloexec(w)
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(r)
+            os.setpgid(0, 0)
+            for sig in _DEFAULT_SIGNALS:
+                signal.signal(sig, signal.SIG_DFL)
+            os.execvp(argv[0], argv)
+        except OSError, e:
+            os.write(w, str(e.errno))
+        os._exit(127)
+
+    os.close(w)
+    try:
+        while True:
+            try:
+                err = os.read(r, 16)
+                break
+            except OSError, e:
+                if e.errno != errno.EINTR:
+                    raise
+    finally:
+        os.close(r)
+    if err:
+        err = int(err)
+        raise OSError(err, '%s: %s' % (argv[0], os.strerror(err)))
+    return pid
+
+def _close_fds(keep):
+    try:
+        fds = [int(fd) for fd in os.listdir('/proc/self/fd')]
+    except OSError:
+        fds = range(3, 256)
+    for fd in fds:
+        if fd > 2 and fd != keep:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+def _serve(sock, spawn):
+    """The spawn helper's main loop: serves requests from sock until the
+    other end closes it."""
+    children = {}   # pid -> program, for the programs still running
+    exited = {}     # pids reaped before spawn returned them
+
+    def reap(signum, frame):
+        while True:
+            try:
+                pid = os.waitpid(-1, os.WNOHANG)[0]
+            except OSError:
+                return
+            if not pid:
+                return
+            if children.pop(pid, None) is None:
+                exited[pid] = True
+    signal.signal(signal.SIGCHLD, reap)
+
+    while True:
+        try:
+            request = _recv(sock)
+        except (EOFError, socket.error):
+            return
+
+        if request[0] == 'spawn':
+            try:
+                argv = expand_exec(*request[1:])
+                if not argv:
+                    raise LaunchError('Empty Exec line')
+                pid = spawn(argv)
+            except (LaunchError, OSError), e:
+                _send(sock, 'error', str(e))
+                continue
+            if not exited.pop(pid, False):
+                children[pid] = argv[0]
+            _send(sock, 'ok', str(pid))
+        elif request[0] == 'children':
+            _send(sock, 'ok', *[str(pid) for pid in sorted(children)])
+        else:
+            _send(sock, 'error', 'Unknown request %r' % request[0])
+
+class DBusLauncher(object):
+    """Asks linkappd to start applications, over D-Bus."""
+
+    @metrics.timed('dbus')
+    def launch(self, entry):
+        try:
+            DBusException = dbus.DBusException
+        except ImportError, e:
+            raise LaunchError('D-Bus is unavailable: %s' % e)
+        try:
+            session_bus = dbus.SessionBus()
+            obj = session_bus.get_object('tv.neuros.LinkHome', '/LinkHome')
+            obj.AppStart(entry.Exec, dbus_interface='tv.neuros.LinkHome')
+        except DBusException, e:
+            raise LaunchError('linkappd: %s' % e)
+
+class LocalLauncher(object):
+    """Starts applications from a spawn helper, forked when the launcher is
+    created. Create it before the server starts its threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sock = None
+        self.start()
+
+    def start(self):
+        """Forks a new spawn helper."""
+        ours, theirs = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        _cloexec(ours.fileno())
+        _cloexec(theirs.fileno())
+        pid = os.fork()
+        if pid == 0:
+            try:
+                # Fork again so the helper is adopted by init, and nobody
+                # here has to reap it
+                if os.fork() == 0:
+                    ours.close()
+                    _close_fds(theirs.fileno())
+                    _serve(theirs, _load_posix_spawn() or _fork_exec)
+            finally:
+                os._exit(0)
+        theirs.close()
+        os.waitpid(pid, 0)
+        self._sock = ours
+
+    def _call(self, *fields):
+        self._lock.acquire()
+        try:
+            if self._sock is None:
+                raise LaunchError('Spawn helper is gone')
+            try:
+                _send(self._sock, *fields)
+                reply = _recv(self._sock)
+            except (EOFError, socket.error), e:
+                log.error('Spawn helper is gone: %s', e)
+                self._sock.close()
+                self._sock = None
+                raise LaunchError('Spawn helper failed: %s' % e)
+        finally:
+            self._lock.release()
+        if reply[0] != 'ok':
+            raise LaunchError(reply[1])
+        return reply[1:]
+
+    @metrics.timed('spawn')
+    def launch(self, entry):
+        """Starts the application of entry, and returns its pid."""
+        if not getattr(entry, 'Exec', None):
+            raise LaunchError('%s has no Exec line' % entry.name)
+        return int(self._call('spawn', entry.Exec, entry.AppName,
+                              getattr(entry, 'Icon', ''),
+                              getattr(entry, 'fullpath', ''))[0])
+
+    def children(self):
+        """Returns the pids of the applications started that are still
+        running."""
+        return [int(pid) for pid in self._call('children') if pid]
+
+class FallbackLauncher(object):
+    """Tries each of launchers in turn, until one starts the application."""
+
+    def __init__(self, *launchers):
+        self.launchers = launchers
+
+    def launch(self, entry):
+        errors = []
+        for launcher in self.launchers:
+            try:
+                return launcher.launch(entry)
+            except LaunchError, e:
+                log.info('%s cannot launch %s: %s',
+                         launcher.__class__.__name__, entry.name, e)
+                errors.append(str(e))
+        raise LaunchError('; '.join(errors))
+
+def make_launcher(kind):
+    """Returns the launcher linkhome.launcher names: dbus, local or auto."""
+    if kind == 'dbus':
+        return DBusLauncher()
+    if kind == 'local':
+        return LocalLauncher()
+    if kind == 'auto':
+        return FallbackLauncher(DBusLauncher(), LocalLauncher())
+    raise ValueError('Unknown linkhome.launcher %r' % kind)
@@ -0,0 +1,156 @@
+"""The application launch log
+
+Every launch is appended to a binary log of fixed-size records, and each
+application keeps a frecency score: launches count for less as they age,
+halving in weight every ``half_life`` seconds. Scores live in memory and
+a launch updates one of them in constant time, so ordering the menu
+never touches the log.
+
+Decay is kept out of the stored scores. Each launch adds
+``2 ** ((t - epoch) / half_life)``, which preserves the ordering of apps
+at any instant, and only compaction, which rewrites the log as one
+record per application, moves the epoch forward.
+
+A record is a launch time (seconds, unsigned 32 bit), a weight (float 32,
+1.0 for a launch) and the application's name, NUL padded to 56 bytes;
+longer names are truncated, and their history won't survive a restart. A
+partly written record at the end of the file, e.g. from a power cut, is
+ignored and dropped at the next compaction.
+"""
+import logging
+import os
+import struct
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+RECORD = struct.Struct('!If56s')
+
+class LaunchLog(object):
+    """Launch history for the applications in the menu, kept in path."""
+
+    def __init__(self, path, half_life=14 * 24 * 3600, compact_after=4096):
+        self.path = path
+        self.half_life = float(half_life)
+        self.compact_after = compact_after
+        self._lock = threading.Lock()
+        self._scores = {}
+        self._epoch = time.time()
+        self._records = 0
+        self._fd = None
+        self._load()
+
+    def _weight(self, when):
+        return 2.0 ** ((when - self._epoch) / self.half_life)
+
+    def _load(self):
+        try:
+            f = open(self.path, 'rb')
+        except IOError:
+            return
+        try:
+            data = f.read()
+        finally:
+            f.close()
+
+        for offset in xrange(0, len(data) - RECORD.size + 1, RECORD.size):
+            when, weight, name = RECORD.unpack_from(data, offset)
+            name = name.rstrip('\0')
+            self._scores[name] = self._scores.get(name, 0.0) + \
+                                 weight * self._weight(when)
+            self._records += 1
+
+        if len(data) % RECORD.size or \
+           self._records > max(2 * len(self._scores), 64):
+            self.compact()
+
+    def _open(self):
+        if self._fd is None:
+            dirname = os.path.dirname(self.path)
+            if dirname and not os.path.isdir(dirname):
+                os.makedirs(dirname)
+            self._fd = os.open(self.path,
+                               os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0644)
+        return self._fd
+
+    def record(self, name, when=None):
+        """Records a launch of the application called name."""
+        if when is None:
+            when = time.time()
+        self._lock.acquire()
+        try:
+            self._scores[name] = self._scores.get(name, 0.0) + \
+                                 self._weight(when)
+            try:
+                os.write(self._open(), RECORD.pack(int(when), 1.0, name))
+            except (IOError, OSError), e:
+                # The menu order is a nicety; never fail a launch over it
+                log.warn('Cannot write to launch log %s: %s', self.path, e)
+                return
+            self._records += 1
+            compact = self._records >= self.compact_after
+        finally:
+            self._lock.release()
+
+        if compact:
+            self.compact()
+
+    def compact(self, forget=0.01):
+        """Rewrites the log as one record per application, weighted by its
+        decayed score, and drops applications whose score has decayed
+        below forget."""
+        self._lock.acquire()
+        try:
+            now = time.time()
+            decay = self._weight(now)
+            scores = {}
+            for (name, score) in self._scores.items():
+                if score / decay >= forget:
+                    scores[name] = score / decay
+
+            tmp = self.path + '.tmp'
+            try:
+                dirname = os.path.dirname(self.path)
+                if dirname and not os.path.isdir(dirname):
+                    os.makedirs(dirname)
+                f = open(tmp, 'wb')
+                try:
+                    for (name, score) in scores.items():
+                        f.write(RECORD.pack(int(now), score, name))
+                    f.flush()
+                    os.fsync(f.fileno())
+                finally:
+                    f.close()
+                os.rename(tmp, self.path)
+            except (IOError, OSError), e:
+                log.warn('Cannot compact launch log %s: %s', self.path, e)
+                return
+
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            self._scores = scores
+            self._epoch = now
+            self._records = len(scores)
+        finally:
+            self._lock.release()
+
+    def score(self, name):
+        """Returns the current frecency score of name: the number of
+        launches it has, each discounted by its age."""
+        self._lock.acquire()
+        try:
+            return self._scores.get(name, 0.0) / self._weight(time.time())
+        finally:
+            self._lock.release()
+
+    def rank(self, entries):
+        """Returns entries, which must have a name attribute, most used
+        first. The sort is stable, so unused entries keep their order."""
+        self._lock.acquire()
+        try:
+            scores = self._scores
+            return sorted(entries, key=lambda e: -scores.get(e.name, 0.0))
+        finally:
+            self._lock.release()
@@ -0,0 +1,111 @@
+"""Lazy imports and import timing
+
+Heavy modules that most requests never need, like D-Bus, can be bound
+with ``lazy_import`` instead of an import statement; the real import
+happens on first use::
+
+    dbus = lazy_import('dbus')
+
+Setting LINKHOME_IMPORT_TIMES in the environment installs an import timer
+from linkhome/__init__.py, which records how long every module takes to
+import while the application boots; ``log_startup_report`` writes the
+slowest of them to the log.
+"""
+import __builtin__
+import logging
+import sys
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# Module name -> (self seconds, cumulative seconds), for modules imported
+# while the timer was installed, and for every lazy import.
+import_times = {}
+
+_lock = threading.RLock()
+_started = None
+
+def _import(name):
+    start = time.time()
+    __import__(name)
+    elapsed = time.time() - start
+    import_times.setdefault(name, (elapsed, elapsed))
+    log.debug('Lazily imported %s in %.1fms', name, elapsed * 1000)
+    return sys.modules[name]
+
+class LazyModule(object):
+    """Stands in for a module until one of its attributes is used."""
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            _lock.acquire()
+            try:
+                module = self.__dict__['_module']
+                if module is None:
+                    module = self.__dict__['_module'] = _import(self._name)
+            finally:
+                _lock.release()
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        if self.__dict__['_module'] is None:
+            return '<lazy module %r (not loaded)>' % self._name
+        return repr(self.__dict__['_module'])
+
+def lazy_import(name):
+    """Returns a stand-in for the module name, imported on first use."""
+    return LazyModule(name)
+
+def install_import_timer():
+    """Wraps __import__ so that every module imported from now on has its
+    import time recorded in import_times."""
+    global _started
+    if _started is not None:
+        return
+    _started = time.time()
+
+    real_import = __builtin__.__import__
+    # Time spent in nested imports, per level, so self time can be derived
+    stack = []
+
+    def timed_import(name, *args, **kwargs):
+        if name in sys.modules:
+            return real_import(name, *args, **kwargs)
+        stack.append(0.0)
+        start = time.time()
+        try:
+            return real_import(name, *args, **kwargs)
+        finally:
+            elapsed = time.time() - start
+            children = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            if name in sys.modules:
+                import_times.setdefault(name, (elapsed - children, elapsed))
+
+    __builtin__.__import__ = timed_import
+
+def log_startup_report(limit=25):
+    """Logs the slowest imports recorded so far, and the time since the
+    import timer was installed."""
+    if _started is None:
+        return
+    items = sorted(import_times.items(), key=lambda i: -i[1][0])
+    log.info('Application loaded %.1fms after import timing started; '
+             '%d modules imported', (time.time() - _started) * 1000,
+             len(import_times))
+    log.info('%10s %10s  %s', 'self ms', 'total ms', 'module')
+    for (name, (own, total)) in items[:limit]:
+        log.info('%10.1f %10.1f  %s', own * 1000, total * 1000, name)
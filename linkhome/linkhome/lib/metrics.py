@@ -0,0 +1,273 @@
+"""Request timing and profiling
+
+Records how long each stage of a request takes (routing, controller
+action, template render, launches and file I/O), per route, in
+fixed-bucket histograms. MetricsMiddleware serves the histograms at
+``/_metrics`` in the Prometheus text format, and can run a single request
+under cProfile when it carries the ``X-Linkhome-Profile`` header. Other
+middleware adds its own counters to the same page, through
+``registry.counter``.
+
+Controllers mark up the interesting calls with the ``timed`` decorator::
+
+    @metrics.timed('file')
+    def _read(path):
+        ...
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+
+from paste.deploy.converters import asbool, aslist
+
+log = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, of the histogram buckets. The last bucket is
+# implicitly +Inf.
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0)
+
+# The stages timed and timings may be recorded under; timed refuses others,
+# so a typo doesn't quietly start a new series
+STAGES = ('request', 'routing', 'action', 'render', 'dbus', 'spawn',
+          'file')
+
+START_KEY = 'linkhome.metrics.start'
+PROFILE_HEADER = 'HTTP_X_LINKHOME_PROFILE'
+
+class Histogram(object):
+    """A latency histogram over BUCKETS. Memory use is fixed no matter how
+    many observations are made."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+class Counter(object):
+    """A value that only goes up, such as a number of bytes or seconds.
+    Get one from Registry.counter."""
+
+    def __init__(self, name, help, lock):
+        self.name = name
+        self.help = help
+        self.value = 0
+        self._lock = lock
+
+    def inc(self, amount=1):
+        self._lock.acquire()
+        try:
+            self.value += amount
+        finally:
+            self._lock.release()
+
+class Registry(object):
+    """Holds one Histogram per (stage, route) pair. Routes come from the
+    routes map, so the number of histograms is bounded; anything that
+    didn't route to a controller is lumped under 'unrouted'.
+
+    Other parts of the application register their own counters, by name,
+    with counter()."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    def counter(self, name, help):
+        """Returns the counter called name, creating it if needed."""
+        self._lock.acquire()
+        try:
+            counter = self._counters.get(name)
+            if counter is None:
+                counter = self._counters[name] = Counter(name, help,
+                                                         self._lock)
+            return counter
+        finally:
+            self._lock.release()
+
+    def observe(self, stage, route, seconds):
+        self._lock.acquire()
+        try:
+            hist = self._histograms.get((stage, route))
+            if hist is None:
+                hist = self._histograms[(stage, route)] = Histogram()
+            hist.observe(seconds)
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._histograms.clear()
+            for counter in self._counters.values():
+                counter.value = 0
+        finally:
+            self._lock.release()
+
+    def render(self):
+        """Returns every histogram and counter in the Prometheus text
+        exposition format."""
+        lines = ['# HELP linkhome_stage_seconds Time spent in each stage of a '
+                 'request, by route.',
+                 '# TYPE linkhome_stage_seconds histogram']
+        self._lock.acquire()
+        try:
+            items = [(k, list(h.counts), h.sum, h.count)
+                     for (k, h) in self._histograms.items()]
+            counters = [(c.name, c.help, c.value)
+                        for c in self._counters.values()]
+        finally:
+            self._lock.release()
+
+        items.sort()
+        for ((stage, route), counts, total, count) in items:
+            labels = 'stage="%s",route="%s"' % (stage, route)
+            cumulative = 0
+            for (bound, n) in zip(BUCKETS + ('+Inf',), counts):
+                cumulative += n
+                lines.append('linkhome_stage_seconds_bucket{%s,le="%s"} %d' %
+                             (labels, bound, cumulative))
+            lines.append('linkhome_stage_seconds_sum{%s} %f' % (labels, total))
+            lines.append('linkhome_stage_seconds_count{%s} %d' %
+                         (labels, count))
+
+        counters.sort()
+        for (name, help, value) in counters:
+            lines.append('# HELP %s %s' % (name, help))
+            lines.append('# TYPE %s counter' % name)
+            lines.append('%s %s' % (name, value))
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+
+def route_name(environ):
+    """Returns the 'controller.action' label for a request."""
+    routes_dict = environ.get('pylons.routes_dict') or {}
+    controller = routes_dict.get('controller')
+    if not controller:
+        return 'unrouted'
+    # Routes gives unicode; keep labels str so the exposition stays bytes
+    name = '%s.%s' % (controller, routes_dict.get('action', 'index'))
+    return name.encode('utf-8')
+
+def observe(stage, seconds, environ=None):
+    """Records a timing for stage against the route of environ, or of the
+    current Pylons request if environ isn't given."""
+    if environ is None:
+        try:
+            from pylons import request
+            environ = request.environ
+        except (TypeError, AttributeError):
+            # No request registered, e.g. from a shell or a background thread
+            environ = {}
+    registry.observe(stage, route_name(environ), seconds)
+
+def timed(stage):
+    """Decorator recording the duration of every call to the decorated
+    function under stage, one of STAGES."""
+    if stage not in STAGES:
+        raise ValueError('Unknown stage %r' % stage)
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            start = time.time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(stage, time.time() - start)
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        wrapper.__dict__.update(func.__dict__)
+        return wrapper
+    return decorator
+
+class _TimedIterable(object):
+    """Wraps an app_iter so the request is only considered finished once the
+    server has consumed and closed it."""
+
+    def __init__(self, app_iter, environ, start):
+        self.app_iter = app_iter
+        self.environ = environ
+        self.start = start
+
+    def __iter__(self):
+        return iter(self.app_iter)
+
+    def close(self):
+        try:
+            if hasattr(self.app_iter, 'close'):
+                self.app_iter.close()
+        finally:
+            observe('request', time.time() - self.start, self.environ)
+
+class MetricsMiddleware(object):
+    """Times every request, serves ``/_metrics`` and handles on-demand
+    profiling.
+
+    Options, read from the application config:
+
+    ``metrics.allow``
+        Addresses allowed to read ``/_metrics`` and request profiles.
+        Defaults to ``127.0.0.1``.
+
+    ``metrics.profile``
+        Whether the ``X-Linkhome-Profile`` header is honoured. Profiles are
+        written under ``<cache_dir>/profiles``. Defaults to false.
+    """
+
+    def __init__(self, app, config):
+        self.app = app
+        self.allow = aslist(config.get('metrics.allow', '127.0.0.1'))
+        self.profile = asbool(config.get('metrics.profile', False))
+        self.profile_dir = os.path.join(
+            config.get('pylons.cache_dir') or '/tmp', 'profiles')
+
+    def __call__(self, environ, start_response):
+        start = time.time()
+        environ[START_KEY] = start
+        internal = environ.get('REMOTE_ADDR') in self.allow
+
+        if environ.get('PATH_INFO') == '/_metrics':
+            if not internal:
+                start_response('404 Not Found', [('Content-Type',
+                                                  'text/plain')])
+                return ['Not Found']
+            start_response('200 OK', [('Content-Type',
+                                       'text/plain; version=0.0.4')])
+            return [registry.render()]
+
+        if self.profile and internal and environ.get(PROFILE_HEADER):
+            return self._profile(environ, start_response, start)
+
+        return _TimedIterable(self.app(environ, start_response), environ,
+                              start)
+
+    def _profile(self, environ, start_response, start):
+        import cProfile
+
+        profiler = cProfile.Profile()
+        body = profiler.runcall(lambda: self._consume(environ, start_response))
+        observe('request', time.time() - start, environ)
+
+        if not os.path.isdir(self.profile_dir):
+            os.makedirs(self.profile_dir)
+        fname = os.path.join(self.profile_dir, '%d-%s.prof' %
+                             (int(start * 1000), route_name(environ)))
+        profiler.dump_stats(fname)
+        log.info('Wrote profile of %s to %s', environ.get('PATH_INFO'), fname)
+        return body
+
+    def _consume(self, environ, start_response):
+        app_iter = self.app(environ, start_response)
+        try:
+            return list(app_iter)
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
@@ -0,0 +1,180 @@
+"""Application pre-warming
+
+Most of an application's cold start is spent reading its binary and
+shared libraries off disk. When the menu is shown, or an entry is
+focused, the Prewarmer resolves the entries' Exec binaries and their
+shared library closures (from ``ldd``, cached per binary) and asks the
+kernel to start reading them into the page cache with
+``posix_fadvise(POSIX_FADV_WILLNEED)``, from a background thread.
+
+Each pass stops at a memory budget, also capped at half of the free
+memory, and files warmed recently are skipped, so pre-warming doesn't
+push more useful pages out of the cache.
+"""
+import logging
+import os
+import Queue
+import re
+import shlex
+import subprocess
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+POSIX_FADV_WILLNEED = 3
+
+_ldd_line = re.compile(r'(?:=>\s*)?(/\S+)\s+\(0x[0-9a-f]+\)')
+
+def _load_fadvise():
+    """Returns libc's posix_fadvise64 through ctypes, or None."""
+    try:
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library('c'))
+        fadvise = libc.posix_fadvise64
+    except (ImportError, OSError, AttributeError), e:
+        log.info('posix_fadvise unavailable, pre-warming disabled: %s', e)
+        return None
+    fadvise.argtypes = [ctypes.c_int, ctypes.c_longlong, ctypes.c_longlong,
+                        ctypes.c_int]
+    fadvise.restype = ctypes.c_int
+    return fadvise
+
+def resolve_exec(command):
+    """Returns the path of the binary an Exec line runs, or None."""
+    try:
+        args = shlex.split(command)
+    except ValueError:
+        return None
+    for arg in args:
+        # Skip leading 'VAR=value' assignments, and env itself
+        if '=' in arg or arg == 'env':
+            continue
+        if os.sep in arg:
+            return os.path.isfile(arg) and os.path.realpath(arg) or None
+        for dirname in os.environ.get('PATH', '/usr/bin:/bin').split(':'):
+            path = os.path.join(dirname, arg)
+            if os.path.isfile(path) and os.access(path, os.X_OK):
+                return os.path.realpath(path)
+        return None
+    return None
+
+def free_memory():
+    """Returns MemFree from /proc/meminfo in bytes, or None."""
+    try:
+        f = open('/proc/meminfo')
+        try:
+            for line in f:
+                if line.startswith('MemFree:'):
+                    return int(line.split()[1]) * 1024
+        finally:
+            f.close()
+    except (IOError, ValueError):
+        pass
+    return None
+
+class Prewarmer(object):
+    """Pre-warms the page cache for the applications it's given, in a
+    background thread, within budget bytes per pass."""
+
+    def __init__(self, budget=64 * 1024 * 1024, interval=300):
+        self.budget = budget
+        self.interval = interval
+        self._fadvise = _load_fadvise()
+        self._libraries = {}    # binary -> (mtime, [binary and its libs])
+        self._warmed = {}       # path -> when it was last warmed
+        self._queue = Queue.Queue(16)
+        self._thread = None
+
+    def prewarm(self, commands):
+        """Queues the binaries behind a list of Exec lines for warming.
+        Never blocks; if the worker is behind, the request is dropped."""
+        if self._fadvise is None or not commands:
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run,
+                                            name='linkhome-prewarm')
+            self._thread.setDaemon(True)
+            self._thread.start()
+        try:
+            self._queue.put_nowait(list(commands))
+        except Queue.Full:
+            pass
+
+    def _run(self):
+        while True:
+            commands = self._queue.get()
+            try:
+                self.warm(commands)
+            except Exception:
+                log.exception('Pre-warming failed')
+
+    def closure(self, binary):
+        """Returns binary followed by the shared libraries it loads."""
+        try:
+            mtime = os.stat(binary).st_mtime
+        except OSError:
+            return []
+        cached = self._libraries.get(binary)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        paths = [binary]
+        devnull = open(os.devnull, 'w')
+        try:
+            try:
+                ldd = subprocess.Popen(['ldd', binary],
+                                       stdout=subprocess.PIPE, stderr=devnull)
+                output = ldd.communicate()[0]
+            except OSError, e:
+                log.debug('Cannot run ldd on %s: %s', binary, e)
+                output = ''
+        finally:
+            devnull.close()
+        for line in output.splitlines():
+            match = _ldd_line.search(line)
+            if match:
+                path = os.path.realpath(match.group(1))
+                if path not in paths:
+                    paths.append(path)
+        self._libraries[binary] = (mtime, paths)
+        return paths
+
+    def warm(self, commands):
+        """Warms the binaries of commands, in order, until the budget is
+        spent. Returns the number of bytes advised."""
+        budget = self.budget
+        free = free_memory()
+        if free is not None:
+            budget = min(budget, free // 2)
+
+        now = time.time()
+        spent = 0
+        for command in commands:
+            binary = resolve_exec(command)
+            if binary is None:
+                continue
+            for path in self.closure(binary):
+                if now - self._warmed.get(path, 0) < self.interval:
+                    continue
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    continue
+                if spent + size > budget:
+                    return spent
+                if self._advise(path, size):
+                    self._warmed[path] = now
+                    spent += size
+        return spent
+
+    def _advise(self, path, size):
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return False
+        try:
+            return self._fadvise(fd, 0, size, POSIX_FADV_WILLNEED) == 0
+        finally:
+            os.close(fd)
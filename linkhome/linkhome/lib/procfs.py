@@ -0,0 +1,146 @@
+"""Reading many procfs files at one instant
+
+ProcReader.snapshot reads a set of procfs files back to back, under one
+lock, and stamps them with a single CLOCK_MONOTONIC reading, so that
+e.g. ``stat`` and ``loadavg`` describe the same moment.
+
+Most procfs files regenerate their contents whenever they are read from
+offset 0, so the reader keeps their descriptors open between snapshots
+and rewinds them with ``lseek`` instead of paying for an open and close
+each time. Files that can't be rewound are reopened on every read.
+
+Only files directly under the root, like the ones the ``/proc`` pages
+list, and a few network statistics below it can be read. Anything deeper
+would reach through ``self`` or a process's ``root`` and ``cwd`` links into
+the rest of the filesystem.
+"""
+import errno
+import logging
+import os
+import threading
+import time
+
+import linkhome.lib.metrics as metrics
+
+log = logging.getLogger(__name__)
+
+CLOCK_MONOTONIC = 1
+
+# The files below the top level a snapshot may read
+NESTED = ('net/dev', 'net/wireless', 'net/route', 'net/arp', 'net/snmp',
+          'net/netstat', 'net/sockstat', 'net/tcp', 'net/udp')
+
+def _load_monotonic():
+    """Returns a function reading CLOCK_MONOTONIC in seconds, through
+    ctypes, or time.time if the clock is unavailable."""
+    try:
+        import ctypes
+        import ctypes.util
+
+        class timespec(ctypes.Structure):
+            _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+        librt = ctypes.CDLL(ctypes.util.find_library('rt'))
+        clock_gettime = librt.clock_gettime
+    except (ImportError, OSError, AttributeError), e:
+        log.info('CLOCK_MONOTONIC unavailable, using wall time: %s', e)
+        return time.time
+    clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+    clock_gettime.restype = ctypes.c_int
+
+    def monotonic():
+        t = timespec()
+        if clock_gettime(CLOCK_MONOTONIC, ctypes.byref(t)) != 0:
+            return time.time()
+        return t.tv_sec + t.tv_nsec * 1e-9
+    return monotonic
+
+monotonic = _load_monotonic()
+
+class ProcReader(object):
+    """Reads files under root, keeping up to max_open of them open."""
+
+    def __init__(self, root='/proc', max_open=64):
+        self.root = root
+        self.max_open = max_open
+        self._lock = threading.Lock()
+        self._fds = {}          # name -> open descriptor
+        self._once = {}         # names that can't be rewound
+
+    def path(self, name):
+        """Returns the path of name under root, or None if it isn't an entry
+        directly under root or one of NESTED."""
+        if name not in NESTED and ('/' in name or '\0' in name or
+                                   name in ('', '.', '..')):
+            return None
+        return os.path.join(self.root, name)
+
+    def _read_fd(self, fd):
+        chunks = []
+        while True:
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                return ''.join(chunks)
+            chunks.append(chunk)
+
+    def _read(self, name, path):
+        fd = self._fds.get(name)
+        if fd is not None:
+            try:
+                os.lseek(fd, 0, 0)
+                return self._read_fd(fd)
+            except OSError, e:
+                del self._fds[name]
+                os.close(fd)
+                if e.errno not in (errno.ESPIPE, errno.EINVAL):
+                    raise
+                self._once[name] = True
+
+        if path is None:
+            path = self.path(name)
+        fd = os.open(path, os.O_RDONLY | getattr(os, 'O_NONBLOCK', 0))
+        try:
+            text = self._read_fd(fd)
+        except:
+            os.close(fd)
+            raise
+        if name not in self._once and len(self._fds) < self.max_open:
+            self._fds[name] = fd
+        else:
+            os.close(fd)
+        return text
+
+    @metrics.timed('file')
+    def snapshot(self, names):
+        """Reads every file in names. Returns the monotonic time the reads
+        started, how long they took, a dict of name -> contents, and a dict
+        of name -> error message for the files that couldn't be read."""
+        files = {}
+        errors = {}
+        self._lock.acquire()
+        try:
+            start = monotonic()
+            for name in names:
+                path = None
+                if name not in self._fds:
+                    path = self.path(name)
+                    if path is None or not os.path.isfile(path):
+                        errors[name] = 'No such file'
+                        continue
+                try:
+                    files[name] = self._read(name, path)
+                except (IOError, OSError), e:
+                    errors[name] = e.strerror or str(e)
+            elapsed = monotonic() - start
+        finally:
+            self._lock.release()
+        return start, elapsed, files, errors
+
+    def close(self):
+        self._lock.acquire()
+        try:
+            for fd in self._fds.values():
+                os.close(fd)
+            self._fds.clear()
+        finally:
+            self._lock.release()
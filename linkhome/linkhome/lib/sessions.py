@@ -0,0 +1,218 @@
+"""Sessions
+
+None of the menu, icon or procfs pages need session state, so a request
+only gets a session when its controller first touches ``session``. Until
+then the proxy SessionMiddleware puts in the environ does no session I/O
+and no cookie is sent.
+
+With ``beaker.session.type = cookie``, sessions are kept by the client
+instead of in Beaker's file or memory storage. A session is then JSON in
+a cookie signed with ``beaker.session.secret``, so sessions never touch
+the disk. The cookie is only sent when the session is saved. Values must
+be JSON serializable and the whole session must fit in a 4KB cookie, and
+``beaker.session.timeout`` counts from the last save rather than the last
+request.
+"""
+import base64
+import Cookie
+import hashlib
+import hmac
+import logging
+import os
+import time
+import UserDict
+from datetime import datetime, timedelta
+
+from beaker.session import SessionObject
+from beaker.util import coerce_session_params
+
+from linkhome.lib.lazy import lazy_import
+
+simplejson = lazy_import('simplejson')
+
+log = logging.getLogger(__name__)
+
+# Browsers ignore bigger cookies
+MAX_COOKIE = 4096
+
+# The secrets the shipped configs come with, and no secret at all; anyone
+# could forge cookie sessions signed with these
+DEFAULT_SECRETS = (None, '', 'somesecret')
+
+_EXPIRED = 'Thu, 01-Jan-1970 00:00:00 GMT'
+
+def _sign(secret, value):
+    return hmac.new(secret, value, hashlib.sha1).hexdigest()
+
+def _equal(a, b):
+    """Compares two strings in a time that doesn't depend on where they
+    differ."""
+    if len(a) != len(b):
+        return False
+    result = 0
+    for (x, y) in zip(a, b):
+        result |= ord(x) ^ ord(y)
+    return result == 0
+
+class CookieSession(UserDict.DictMixin):
+    """A session stored in a signed cookie, with the interface of Beaker's
+    Session. request is the dict Beaker's SessionObject passes sessions:
+    the request's Cookie header comes in as 'cookie', and the Set-Cookie
+    header goes out as 'cookie_out' when 'set_cookie' is true."""
+
+    def __init__(self, request, key='beaker.session.id', secret=None,
+                 timeout=None, cookie_expires=True, **ignored):
+        if not secret:
+            raise ValueError('Cookie sessions need beaker.session.secret')
+        self.request = request
+        self.key = key
+        self.secret = secret
+        self.timeout = timeout
+        self.cookie_expires = cookie_expires
+        self.was_invalidated = False
+
+        self.dict = self._load(request.get('cookie'))
+        if self.dict is None:
+            self._create()
+        else:
+            self.is_new = False
+
+    id = property(lambda self: self.dict['_id'])
+    created = property(lambda self: self.dict['_creation_time'])
+
+    def _create(self):
+        self.dict = {'_id': os.urandom(16).encode('hex'),
+                     '_creation_time': time.time()}
+        self.is_new = True
+
+    def _load(self, header):
+        """Returns the session data in the Cookie header, or None if there
+        is none, or it is forged, corrupt or timed out."""
+        if not header:
+            return None
+        try:
+            cookie = Cookie.SimpleCookie(header)
+        except Cookie.CookieError:
+            return None
+        if self.key not in cookie:
+            return None
+
+        value = cookie[self.key].value
+        signature, payload = value[:40], value[40:]
+        if not _equal(signature, _sign(self.secret, payload)):
+            log.debug('Ignoring session cookie with a bad signature')
+            return None
+        try:
+            data = simplejson.loads(base64.urlsafe_b64decode(
+                payload + '=' * (-len(payload) % 4)))
+        except (TypeError, ValueError):
+            return None
+        if not isinstance(data, dict) or '_id' not in data:
+            return None
+        if self.timeout is not None and \
+           time.time() - data.get('_accessed_time', 0) > self.timeout:
+            return None
+        return data
+
+    def _expires(self):
+        if self.cookie_expires is True:
+            return None
+        if self.cookie_expires is False:
+            expires = datetime.utcfromtimestamp(0x7FFFFFFF)
+        elif isinstance(self.cookie_expires, timedelta):
+            expires = datetime.utcnow() + self.cookie_expires
+        else:
+            expires = self.cookie_expires
+        return expires.strftime('%a, %d-%b-%Y %H:%M:%S GMT')
+
+    def _set_cookie(self, value, expires):
+        header = '%s=%s; Path=/' % (self.key, value)
+        if expires:
+            header += '; expires=%s' % expires
+        if len(header) > MAX_COOKIE:
+            raise ValueError('Session too large for a cookie: %d bytes'
+                             % len(header))
+        self.request['cookie_out'] = header
+        self.request['set_cookie'] = True
+
+    def __getitem__(self, key):
+        return self.dict[key]
+
+    def __setitem__(self, key, value):
+        self.dict[key] = value
+
+    def __delitem__(self, key):
+        del self.dict[key]
+
+    def keys(self):
+        return self.dict.keys()
+
+    def save(self):
+        """Sends the session to the client."""
+        self.dict['_accessed_time'] = time.time()
+        payload = base64.urlsafe_b64encode(
+            simplejson.dumps(self.dict)).rstrip('=')
+        self._set_cookie(_sign(self.secret, payload) + payload,
+                         self._expires())
+
+    def delete(self):
+        """Removes the session from the client. It stays usable for the
+        rest of the request."""
+        self._set_cookie('', _EXPIRED)
+
+    def invalidate(self):
+        """Starts a new, empty session, with a new id."""
+        self._create()
+        self.was_invalidated = True
+        self.delete()
+
+    def lock(self):
+        """Nothing to lock; the session lives in the client."""
+
+    def unlock(self):
+        """Nothing to unlock; the session lives in the client."""
+
+class LazySession(SessionObject):
+    """Beaker's lazy session proxy, which creates a CookieSession rather
+    than a Beaker Session when the session type is 'cookie'."""
+
+    def _session(self):
+        params = self.__dict__['_params']
+        if self.__dict__['_sess'] is None and params.get('type') == 'cookie':
+            self.__dict__['_headers'] = request = {
+                'cookie': self.__dict__['_environ'].get('HTTP_COOKIE'),
+                'cookie_out': None, 'set_cookie': False}
+            self.__dict__['_sess'] = CookieSession(request, **params)
+        return SessionObject._session(self)
+
+class SessionMiddleware(object):
+    """Puts a LazySession, configured by the beaker.session.* options in
+    config, in environ[environ_key]. The session's cookie is only sent
+    when a controller used the session."""
+
+    def __init__(self, app, config, environ_key='beaker.session'):
+        self.app = app
+        self.environ_key = environ_key
+        self.options = dict(invalidate_corrupt=True, type=None, data_dir=None,
+                            key='beaker.session.id', timeout=None,
+                            secret=None, log_file=None)
+        for (key, value) in config.iteritems():
+            if key.startswith('beaker.session.'):
+                self.options[key[15:]] = value
+        coerce_session_params(self.options)
+        if self.options['type'] == 'cookie' and \
+           self.options['secret'] in DEFAULT_SECRETS:
+            raise ValueError('Cookie sessions need a beaker.session.secret '
+                             'of their own')
+
+    def __call__(self, environ, start_response):
+        session = LazySession(environ, **self.options)
+        environ[self.environ_key] = session
+
+        def session_start_response(status, headers, exc_info=None):
+            if session.__dict__['_sess'] is not None:
+                request = session.__dict__['_headers']
+                if request.get('set_cookie') and request['cookie_out']:
+                    headers.append(('Set-Cookie', request['cookie_out']))
+            return start_response(status, headers, exc_info)
+        return self.app(environ, session_start_response)
@@ -1,8 +1,17 @@
-<%page args="files" />
+<%page args="files, prewarm=False" />
 <%inherit file="/applications/base.mako" />
 
 <%def name="head_tags()">
 <title>LinkHome - Applications</title>
+% if prewarm:
+<script type="text/javascript">
+function prewarm(name) {
+	var request = new XMLHttpRequest();
+	request.open('GET', '/applications/' + name + '/prewarm', true);
+	request.send(null);
+}
+</script>
+% endif
 </%def>
 
 <p><a id="back_button" href="/">Back</a></p>
@@ -11,7 +20,11 @@
 	<dl>
 		% for f in files:
 		<dd>
-			<a id="menu_item" href="/applications/${f.name}/launch" title="${f.Comment}">
+			<a id="menu_item" href="/applications/${f.name}/launch" title="${f.Comment}"
+			% if prewarm:
+			   onfocus="prewarm('${f.name}')" onmouseover="prewarm('${f.name}')"
+			% endif
+			>
 			<img alt="${f.AppName} Icon" src="/applications/${f.name}/icon" height="128" width="128">
 			<p>${f.AppName}</p>
 			</a>
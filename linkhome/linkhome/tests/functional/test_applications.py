@@ -0,0 +1,26 @@
+from linkhome.tests import *
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+class TestApplicationsController(TestController):
+
+    def test_catalog(self):
+        response = self.app.get('/applications.json', params={'limit': 1})
+        assert response.header('Content-Type') == 'application/json'
+        data = json.loads(response.body)
+        assert len(data['entries']) <= 1
+        if data['cursor']:
+            response = self.app.get('/applications.json',
+                                    params={'cursor': data['cursor']})
+            following = json.loads(response.body)['entries']
+            assert data['entries'][0]['name'] < following[0]['name']
+
+    def test_catalog_bad_limit(self):
+        self.app.get('/applications.json', params={'limit': 'x'}, status=400)
+
+    def test_search(self):
+        response = self.app.get('/applications/search', params={'q': ''})
+        assert json.loads(response.body)['entries'] == []
@@ -0,0 +1,94 @@
+import gzip
+import os
+import shutil
+import tempfile
+from cStringIO import StringIO
+from unittest import TestCase
+
+import paste.fixture
+from paste.urlparser import StaticURLParser
+
+from linkhome.lib.compress import GzipMiddleware, accepts_gzip
+from linkhome.tests import *
+
+CSS = 'body { color: black }\n'
+PNG = '\x89PNG\r\n\x1a\n' + '\0' * 64
+
+def gzipped(data):
+    out = StringIO()
+    f = gzip.GzipFile(fileobj=out, mode='wb')
+    f.write(data)
+    f.close()
+    return out.getvalue()
+
+def gunzip(body):
+    return gzip.GzipFile(fileobj=StringIO(body)).read()
+
+class TestGzipMiddleware(TestController):
+
+    def test_compressed(self):
+        plain = self.app.get('/proc')
+        response = self.app.get('/proc',
+                                headers={'Accept-Encoding': 'gzip, deflate'})
+        assert response.header('Content-Encoding') == 'gzip'
+        assert 'Accept-Encoding' in response.header('Vary')
+        assert gunzip(response.body) == plain.body
+
+    def test_not_accepted(self):
+        response = self.app.get('/proc',
+                                headers={'Accept-Encoding': 'gzip;q=0'})
+        assert 'Content-Encoding' not in dict(response.headers)
+        assert 'meminfo' in response
+
+    def test_accepts_gzip(self):
+        assert accepts_gzip('gzip')
+        assert accepts_gzip('deflate, *;q=0.5')
+        assert not accepts_gzip('')
+        assert not accepts_gzip('identity, gzip;q=0')
+        assert not accepts_gzip('*;q=0')
+
+class TestPrecomputed(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.css_gz = gzipped(CSS)
+        for (name, data) in (('x.css', CSS), ('x.css.gz', self.css_gz),
+                             ('x.png', PNG), ('x.png.gz', gzipped(PNG))):
+            f = open(os.path.join(self.dir, name), 'wb')
+            f.write(data)
+            f.close()
+        config = {'pylons.paths': {'static_files': self.dir}}
+        self.app = paste.fixture.TestApp(
+            GzipMiddleware(StaticURLParser(self.dir), config))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def get(self, path, encoding='gzip'):
+        return self.app.get(path, headers={'Accept-Encoding': encoding})
+
+    def test_precomputed(self):
+        response = self.get('/x.css')
+        assert response.header('Content-Encoding') == 'gzip'
+        assert response.header('Content-Type').startswith('text/css')
+        assert response.header('Vary') == 'Accept-Encoding'
+        # Too short to compress on the fly, so this is the .gz file
+        assert response.body == self.css_gz
+        assert gunzip(response.body) == CSS
+
+    def test_not_accepted(self):
+        response = self.get('/x.css', encoding='identity')
+        assert 'Content-Encoding' not in dict(response.headers)
+        assert response.body == CSS
+
+    def test_stale(self):
+        os.utime(os.path.join(self.dir, 'x.css.gz'), (1, 1))
+        response = self.get('/x.css')
+        assert 'Content-Encoding' not in dict(response.headers)
+        assert response.body == CSS
+
+    def test_not_compressible(self):
+        response = self.get('/x.png')
+        assert 'Content-Encoding' not in dict(response.headers)
+        assert response.header('Content-Type') == 'image/png'
+        assert response.body == PNG
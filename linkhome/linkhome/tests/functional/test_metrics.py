@@ -0,0 +1,18 @@
+from linkhome.tests import *
+import linkhome.lib.metrics as metrics
+
+class TestMetricsMiddleware(TestController):
+
+    def test_metrics(self):
+        self.app.get(url_for(controller='procfs'))
+        response = self.app.get('/_metrics',
+                                extra_environ={'REMOTE_ADDR': '127.0.0.1'})
+        assert 'route="procfs.index"' in response
+        assert 'stage="render"' in response
+
+    def test_metrics_remote(self):
+        self.app.get('/_metrics', extra_environ={'REMOTE_ADDR': '10.0.0.2'},
+                     status=404)
+
+    def test_timed_stages(self):
+        self.assertRaises(ValueError, metrics.timed, 'fiel')
@@ -1,7 +1,54 @@
 from linkhome.tests import *
 
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
 class TestProcfsController(TestController):
 
     def test_index(self):
         response = self.app.get(url_for(controller='procfs'))
-        # Test response...
+        assert 'meminfo' in response
+
+    def test_get(self):
+        response = self.app.get('/proc/meminfo')
+        assert 'MemTotal' in response
+
+    def test_snapshot(self):
+        response = self.app.get('/proc/_snapshot',
+                                params={'files': 'meminfo,loadavg,nope'})
+        data = json.loads(response.body)
+        assert 'MemTotal' in data['files']['meminfo']
+        assert 'loadavg' in data['files']
+        assert 'nope' in data['errors']
+        assert abs(float(response.header('X-Monotonic')) -
+                   data['monotonic']) < 1e-5
+
+    def test_snapshot_multipart(self):
+        response = self.app.get('/proc/_snapshot',
+                                params={'files': 'meminfo,uptime',
+                                        'format': 'multipart'})
+        boundary = response.header('Content-Type').split('boundary=')[1]
+        assert response.body.count('--' + boundary) == 3
+        assert 'Content-Location: /proc/uptime' in response
+
+    def test_snapshot_multipart_errors(self):
+        response = self.app.get('/proc/_snapshot',
+                                params={'files': 'nope,x\r\nSet-Cookie: a=b,'
+                                                 'uptime',
+                                        'format': 'multipart'})
+        assert response.header('X-Snapshot-Errors') == 'nope'
+        assert 'Content-Location: /proc/uptime' in response
+
+    def test_snapshot_outside_proc(self):
+        for name in ('../etc/passwd', 'self/root/etc/passwd', 'self/environ',
+                     '1/root/etc/passwd', 'net/../self/environ', '.'):
+            response = self.app.get('/proc/_snapshot',
+                                    params={'files': name + ',loadavg'})
+            data = json.loads(response.body)
+            assert data['files'].keys() == ['loadavg'], name
+            assert name in data['errors']
+        response = self.app.get('/proc/_snapshot', params={'files': 'net/dev'})
+        assert 'net/dev' in json.loads(response.body)['files']
+        self.app.get('/proc/_snapshot', status=400)
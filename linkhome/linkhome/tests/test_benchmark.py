@@ -0,0 +1,63 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import TestCase
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+import linkhome
+
+here_dir = os.path.dirname(os.path.dirname(os.path.abspath(linkhome.__file__)))
+
+class TestBenchmark(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def run_benchmark(self, *args):
+        """Runs benchmark.py with args, and returns its standard output."""
+        out = open(os.path.join(self.dir, 'stdout'), 'w+')
+        devnull = open(os.devnull, 'w')
+        bench = subprocess.Popen([sys.executable,
+                                  os.path.join(here_dir, 'benchmark.py'),
+                                  '--requests', '2', '--entries', '2',
+                                  '--launches', '0'] +
+                                 list(args),
+                                 cwd=here_dir, stdout=out, stderr=devnull)
+        deadline = time.time() + 120
+        while bench.poll() is None:
+            if time.time() > deadline:
+                os.kill(bench.pid, 9)
+                self.fail('benchmark.py %s hung' % ' '.join(args))
+            time.sleep(0.1)
+        devnull.close()
+        out.seek(0)
+        stdout = out.read()
+        out.close()
+        assert bench.returncode == 0, stdout
+        return stdout
+
+    def test_stdout(self):
+        # Only the report goes to stdout, not what the controllers print
+        report = json.loads(self.run_benchmark())
+        assert report['mode'] == 'wsgi'
+
+    def test_socket(self):
+        output = os.path.join(self.dir, 'report.json')
+        self.run_benchmark('--socket', '--server', 'production.ini',
+                           '--keepalive', '--concurrency', '2',
+                           '--output', output)
+        report = json.load(open(output))
+        assert report['mode'] == 'socket'
+        names = [r['name'] for r in report['results']]
+        assert 'applications_2' in names
+        assert 'proc_snapshot' in names
@@ -0,0 +1,123 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from linkhome.lib.catalog import Catalog
+
+class TestCatalog(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.write('xbmc', 'XBMC', 'Media center', 'AudioVideo;Player;')
+        self.write('pidgin', 'Pidgin', 'Instant messaging', 'Network;Chat;')
+        self.write('mplayer', 'MPlayer', 'Movie player', 'AudioVideo;')
+        self.write('player', 'Player Settings', 'Configure playback', '')
+        self.write('bcabc', 'Bcabc', 'Odd one', '')
+        self.catalog = Catalog(self.dir, rescan_interval=3600)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, app_name, comment, categories, mtime=None):
+        path = os.path.join(self.dir, name + '.desktop')
+        f = open(path, 'w')
+        f.write('[Desktop Entry]\nName=%s\nComment=%s\nExec=%s\n'
+                'Categories=%s\n' % (app_name, comment, name, categories))
+        f.close()
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+
+    def names(self, entries):
+        return [e.name for e in entries]
+
+    def test_entries(self):
+        assert self.names(self.catalog.entries()) == \
+               ['bcabc', 'mplayer', 'pidgin', 'player', 'xbmc']
+        entry = self.catalog.get('pidgin')
+        assert entry.AppName == 'Pidgin'
+        assert entry.Categories == ['Network', 'Chat']
+        assert self.catalog.get('missing') is None
+
+    def test_page(self):
+        entries, cursor = self.catalog.page(limit=2)
+        assert self.names(entries) == ['bcabc', 'mplayer']
+        assert cursor == 'mplayer'
+        entries, cursor = self.catalog.page(cursor, limit=2)
+        assert self.names(entries) == ['pidgin', 'player']
+        entries, cursor = self.catalog.page(cursor, limit=2)
+        assert self.names(entries) == ['xbmc']
+        assert cursor is None
+        # A cursor needn't be an entry that still exists
+        assert self.names(self.catalog.page('q', limit=10)[0]) == ['xbmc']
+
+    def test_search_prefixes(self):
+        # Short terms match the start of words only
+        assert self.names(self.catalog.search('p')) == \
+               ['pidgin', 'player', 'mplayer', 'xbmc']
+        assert self.names(self.catalog.search('la')) == []
+        assert self.names(self.catalog.search('')) == []
+        assert self.names(self.catalog.search('  ')) == []
+
+    def test_search_trigrams(self):
+        # Longer terms match anywhere in a word
+        assert self.names(self.catalog.search('lay')) == \
+               ['mplayer', 'player', 'xbmc']
+        assert self.names(self.catalog.search('essag')) == ['pidgin']
+        # abcab shares all its trigrams with bcabc without being in it
+        assert self.names(self.catalog.search('abcab')) == []
+
+    def test_search_order(self):
+        # Entries whose AppName starts with the query come first
+        assert self.names(self.catalog.search('player')) == \
+               ['player', 'mplayer', 'xbmc']
+        assert self.names(self.catalog.search('player', limit=1)) == \
+               ['player']
+
+    def test_search_terms(self):
+        # Every term must match
+        assert self.names(self.catalog.search('audio play')) == \
+               ['mplayer', 'xbmc']
+        assert self.names(self.catalog.search('audio chat')) == []
+        assert self.names(self.catalog.search(u'MEDIA Center')) == ['xbmc']
+
+    def test_rescan(self):
+        self.catalog.entries()
+        self.write('xbmc', 'Kodi', 'Media center', '', mtime=1)
+        os.remove(os.path.join(self.dir, 'pidgin.desktop'))
+        self.write('vlc', 'VLC', 'Media player', '')
+
+        # Not due for a rescan yet
+        assert self.catalog.get('vlc') is None
+        self.catalog.refresh(force=True)
+
+        assert self.names(self.catalog.entries()) == \
+               ['bcabc', 'mplayer', 'player', 'vlc', 'xbmc']
+        assert self.catalog.get('xbmc').AppName == 'Kodi'
+        assert self.names(self.catalog.search('kodi')) == ['xbmc']
+        assert self.names(self.catalog.search('xbmc')) == []
+        assert self.names(self.catalog.search('chat')) == []
+        assert self.names(self.catalog.search('media')) == ['xbmc', 'vlc']
+        # Nothing left in the index for removed words
+        assert 'cha' not in self.catalog._index
+        assert 'xbm' not in self.catalog._index
+
+    def test_desktop_files_only(self):
+        self.catalog.entries()
+        shutil.copy(os.path.join(self.dir, 'xbmc.desktop'),
+                    os.path.join(self.dir, 'xbmc.desktop.bak'))
+        self.write('mplayer.old', 'Old MPlayer', '', '')
+        open(os.path.join(self.dir, 'README'), 'w').close()
+        mtimes = dict(self.catalog._mtimes)
+        self.catalog.refresh(force=True)
+
+        assert self.names(self.catalog.entries()) == \
+               ['bcabc', 'mplayer', 'mplayer.old', 'pidgin', 'player', 'xbmc']
+        assert self.catalog.get('mplayer').AppName == 'MPlayer'
+        # The backup neither replaced xbmc nor made it look changed
+        assert self.catalog._mtimes['xbmc'] == mtimes['xbmc']
+
+    def test_missing_dir(self):
+        catalog = Catalog(os.path.join(self.dir, 'missing'))
+        assert catalog.entries() == []
+        assert catalog.search('player') == []
@@ -0,0 +1,88 @@
+import os
+import shutil
+import socket
+import tempfile
+import time
+from unittest import TestCase
+
+from linkhome.lib.launcher import FallbackLauncher, LaunchError, \
+     LocalLauncher, expand_exec
+
+class Entry(object):
+
+    def __init__(self, command):
+        self.name = self.AppName = 'test'
+        self.Exec = command
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+class TestExpandExec(TestCase):
+
+    def test_field_codes(self):
+        assert expand_exec('player %U') == ['player']
+        assert expand_exec('viewer --file=%f -x') == ['viewer', '--file=', '-x']
+        assert expand_exec('app %i %c %k', 'App', 'app.png',
+                           '/usr/share/linkhome/app.desktop') == \
+               ['app', '--icon', 'app.png', 'App',
+                '/usr/share/linkhome/app.desktop']
+        assert expand_exec('app %i') == ['app']
+        assert expand_exec('printf 100%%') == ['printf', '100%']
+
+    def test_quoting(self):
+        assert expand_exec('"/opt/my app/run" "a b" \'\'') == \
+               ['/opt/my app/run', 'a b', '']
+        self.assertRaises(LaunchError, expand_exec, 'app "unbalanced')
+
+class TestLocalLauncher(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.launcher = LocalLauncher()
+
+    def tearDown(self):
+        if self.launcher._sock is not None:
+            self.launcher._sock.close()
+        shutil.rmtree(self.dir)
+
+    def test_launch(self):
+        marker = os.path.join(self.dir, 'launched')
+        pid = self.launcher.launch(Entry('touch %s %%f' % marker))
+        assert pid > 0
+        assert wait_for(lambda: os.path.exists(marker))
+
+    def test_reaps_children(self):
+        marker = os.path.join(self.dir, 'done')
+        pid = self.launcher.launch(
+            Entry('sh -c "sleep 0.2; touch %s"' % marker))
+        assert pid in self.launcher.children()
+        assert wait_for(lambda: pid not in self.launcher.children())
+        assert os.path.exists(marker)
+
+    def test_errors(self):
+        self.assertRaises(LaunchError, self.launcher.launch,
+                          Entry('/nonexistent/program'))
+        self.assertRaises(LaunchError, self.launcher.launch, Entry('%f'))
+        # The helper is still there
+        marker = os.path.join(self.dir, 'launched')
+        self.launcher.launch(Entry('touch %s' % marker))
+        assert wait_for(lambda: os.path.exists(marker))
+
+    def test_helper_gone(self):
+        # The helper sees the end of its requests and exits; it isn't
+        # forked again from a request thread
+        self.launcher._sock.shutdown(socket.SHUT_WR)
+        entry = Entry('true')
+        self.assertRaises(LaunchError, self.launcher.launch, entry)
+        self.assertRaises(LaunchError, self.launcher.launch, entry)
+
+        class Other(object):
+            def launch(self, entry):
+                return 'other'
+        launcher = FallbackLauncher(self.launcher, Other())
+        assert launcher.launch(entry) == 'other'
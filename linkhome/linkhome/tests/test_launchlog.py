@@ -0,0 +1,48 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+
+from linkhome.lib.launchlog import LaunchLog, RECORD
+
+class Entry(object):
+    def __init__(self, name):
+        self.name = name
+
+class TestLaunchLog(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'launches.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_rank(self):
+        launches = LaunchLog(self.path, half_life=3600)
+        now = time.time()
+        launches.record('xbmc', now - 7200)
+        launches.record('xbmc', now - 7200)
+        launches.record('pidgin', now)
+        ranked = launches.rank([Entry(n) for n in 'a', 'pidgin', 'xbmc', 'b'])
+        assert [e.name for e in ranked] == ['pidgin', 'xbmc', 'a', 'b']
+
+    def test_reload(self):
+        launches = LaunchLog(self.path)
+        launches.record('xbmc')
+        launches.record('xbmc')
+        # A torn record at the end is ignored, and compacted away
+        f = open(self.path, 'ab')
+        f.write('torn')
+        f.close()
+        launches = LaunchLog(self.path)
+        assert round(launches.score('xbmc'), 3) == 2.0
+        assert os.path.getsize(self.path) == RECORD.size
+
+    def test_compact(self):
+        launches = LaunchLog(self.path, compact_after=10)
+        for i in range(10):
+            launches.record('mplayer')
+        assert os.path.getsize(self.path) == RECORD.size
+        assert round(launches.score('mplayer'), 3) == 10.0
@@ -0,0 +1,45 @@
+import os
+import shutil
+import sys
+import tempfile
+from unittest import TestCase
+
+from linkhome.lib import lazy
+from linkhome.lib.lazy import lazy_import
+
+MODULE = """
+loads = 0
+def double(x):
+    return 2 * x
+"""
+
+class TestLazyImport(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.name = 'lazy_target_%d' % os.getpid()
+        f = open(os.path.join(self.dir, self.name + '.py'), 'w')
+        f.write(MODULE)
+        f.close()
+        sys.path.insert(0, self.dir)
+
+    def tearDown(self):
+        sys.path.remove(self.dir)
+        sys.modules.pop(self.name, None)
+        lazy.import_times.pop(self.name, None)
+        shutil.rmtree(self.dir)
+
+    def test_lazy_import(self):
+        module = lazy_import(self.name)
+        assert self.name not in sys.modules
+        assert 'not loaded' in repr(module)
+        assert module.double(2) == 4
+        assert sys.modules[self.name] is module._load()
+        assert self.name in lazy.import_times
+        module.loads = 1
+        assert sys.modules[self.name].loads == 1
+        self.assertRaises(AttributeError, getattr, module, 'missing')
+
+    def test_missing_module(self):
+        module = lazy_import(self.name + '_missing')
+        self.assertRaises(ImportError, getattr, module, 'anything')
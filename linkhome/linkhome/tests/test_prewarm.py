@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from linkhome.lib.prewarm import Prewarmer, resolve_exec
+
+LDD = """#!/bin/sh
+echo run >> %(dir)s/ldd.calls
+echo "	linux-vdso.so.1 (0x00007ffd5a1f2000)"
+echo "	libfoo.so.1 => %(dir)s/libfoo.so.1 (0x00007f2a3c000000)"
+echo "	libfoo.so.1 => %(dir)s/libfoo.so.1 (0x00007f2a3c000000)"
+echo "	libbar.so => not found"
+echo "	%(dir)s/ld-linux.so.2 (0x00007f2a3c400000)"
+"""
+
+class TestPrewarm(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.environ.get('PATH')
+        os.environ['PATH'] = self.dir
+        self.app = self.write('app', 100, executable=True)
+
+    def tearDown(self):
+        if self.path is None:
+            del os.environ['PATH']
+        else:
+            os.environ['PATH'] = self.path
+        shutil.rmtree(self.dir)
+
+    def write(self, name, size=0, executable=False, data=None):
+        path = os.path.join(self.dir, name)
+        f = open(path, 'w')
+        f.write(data or 'x' * size)
+        f.close()
+        if executable:
+            os.chmod(path, 0755)
+        return os.path.realpath(path)
+
+    def ldd_calls(self):
+        return open(os.path.join(self.dir, 'ldd.calls')).read().count('run')
+
+    def prewarmer(self, budget, interval=300):
+        """A Prewarmer that records its advice instead of giving it."""
+        prewarmer = Prewarmer(budget=budget, interval=interval)
+        self.advised = []
+        def fadvise(fd, offset, length, advice):
+            self.advised.append(length)
+            return 0
+        prewarmer._fadvise = fadvise
+        return prewarmer
+
+    def test_resolve_exec(self):
+        assert resolve_exec('app --fullscreen %U') == self.app
+        assert resolve_exec('env LANG=C DISPLAY=:0 app') == self.app
+        assert resolve_exec(self.app + ' -x') == self.app
+        assert resolve_exec('"%s"' % self.app) == self.app
+        assert resolve_exec('missing') is None
+        assert resolve_exec(os.path.join(self.dir, 'missing')) is None
+        assert resolve_exec('app "unbalanced') is None
+        assert resolve_exec('LANG=C') is None
+        # Files on PATH must be executable
+        self.write('data', 10)
+        assert resolve_exec('data') is None
+
+    def test_closure(self):
+        self.write('ldd', data=LDD % dict(dir=self.dir), executable=True)
+        libfoo = self.write('libfoo.so.1', 10)
+        ld = self.write('ld-linux.so.2', 10)
+        prewarmer = Prewarmer()
+        assert prewarmer.closure(self.app) == [self.app, libfoo, ld]
+        # Cached until the binary changes
+        assert prewarmer.closure(self.app) == [self.app, libfoo, ld]
+        assert self.ldd_calls() == 1
+        os.utime(self.app, (1, 1))
+        prewarmer.closure(self.app)
+        assert self.ldd_calls() == 2
+        assert prewarmer.closure(os.path.join(self.dir, 'missing')) == []
+
+    def test_warm_budget(self):
+        lib = self.write('lib.so', 80)
+        other = self.write('other', 50, executable=True)
+        prewarmer = self.prewarmer(budget=200)
+        prewarmer._libraries[self.app] = (os.stat(self.app).st_mtime,
+                                          [self.app, lib])
+        prewarmer._libraries[other] = (os.stat(other).st_mtime, [other])
+        # app and lib fit; other would go over the budget
+        assert prewarmer.warm(['app', 'missing', 'other']) == 180
+        assert self.advised == [100, 80]
+
+    def test_warm_interval(self):
+        prewarmer = self.prewarmer(budget=1000)
+        prewarmer._libraries[self.app] = (os.stat(self.app).st_mtime,
+                                          [self.app])
+        assert prewarmer.warm(['app']) == 100
+        # Warmed recently
+        assert prewarmer.warm(['app']) == 0
+        prewarmer.interval = 0
+        assert prewarmer.warm(['app']) == 100
+        assert self.advised == [100, 100]
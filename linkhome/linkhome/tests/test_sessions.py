@@ -0,0 +1,81 @@
+import time
+from unittest import TestCase
+
+from linkhome.lib.sessions import CookieSession, SessionMiddleware
+
+def cookie(request):
+    """Returns the Cookie header a browser would send back after the
+    Set-Cookie header in request."""
+    return request['cookie_out'].split(';')[0]
+
+class TestCookieSession(TestCase):
+
+    def test_round_trip(self):
+        request = {}
+        session = CookieSession(request, key='linkhome', secret='s3cret')
+        assert session.is_new
+        session['user'] = 'neuros'
+        session.save()
+        assert request['set_cookie']
+
+        loaded = CookieSession({'cookie': cookie(request)}, key='linkhome',
+                               secret='s3cret')
+        assert not loaded.is_new
+        assert loaded.id == session.id
+        assert loaded['user'] == 'neuros'
+
+    def test_forged(self):
+        request = {}
+        session = CookieSession(request, key='linkhome', secret='s3cret')
+        session['admin'] = False
+        session.save()
+
+        forged = CookieSession({'cookie': cookie(request)}, key='linkhome',
+                               secret='other')
+        assert forged.is_new
+        tampered = cookie(request)[:-2] + 'xx'
+        assert CookieSession({'cookie': tampered}, key='linkhome',
+                             secret='s3cret').is_new
+
+    def test_timeout(self):
+        request = {}
+        CookieSession(request, key='linkhome', secret='s3cret').save()
+        sent = {'cookie': cookie(request)}
+        assert not CookieSession(sent, key='linkhome', secret='s3cret',
+                                 timeout=60).is_new
+        time.sleep(0.01)
+        assert CookieSession(sent, key='linkhome', secret='s3cret',
+                             timeout=0).is_new
+
+class TestSessionMiddleware(TestCase):
+
+    def call(self, app, config):
+        headers = []
+        def start_response(status, response_headers, exc_info=None):
+            headers.extend(response_headers)
+        SessionMiddleware(app, config)({}, start_response)
+        return [v for (k, v) in headers if k == 'Set-Cookie']
+
+    def test_untouched(self):
+        def app(environ, start_response):
+            start_response('200 OK', [])
+            return []
+        assert self.call(app, {'beaker.session.type': 'cookie',
+                               'beaker.session.secret': 's3cret'}) == []
+
+    def test_saved(self):
+        def app(environ, start_response):
+            environ['beaker.session']['seen'] = True
+            environ['beaker.session'].save()
+            start_response('200 OK', [])
+            return []
+        cookies = self.call(app, {'beaker.session.type': 'cookie',
+                                  'beaker.session.key': 'linkhome',
+                                  'beaker.session.secret': 's3cret'})
+        assert len(cookies) == 1 and cookies[0].startswith('linkhome=')
+
+    def test_default_secret(self):
+        for secret in (None, 'somesecret'):
+            self.assertRaises(ValueError, SessionMiddleware, None,
+                              {'beaker.session.type': 'cookie',
+                               'beaker.session.secret': secret})
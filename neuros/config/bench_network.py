@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+"""Benchmarks bulk IPv4 validation: the packed, single-pass helpers in
+network.py against the per-string, per-octet check IPv4Addr used to do.
+
+Run as 'python bench_network.py [count]'.
+"""
+
+import random
+import sys
+import timeit
+
+import network
+
+def legacy_validate(value):
+    """The per-string path IPv4Addr.validate used before pack_addrs."""
+    if value.find('/') >= 0:
+        value = value.split('/')[0]
+
+    parts = value.split('.')
+    if len(parts) != 4:
+        raise ValueError('%s is not a valid IPv4 address.' % value)
+
+    for part in parts:
+        try:
+            v = int(part)
+        except ValueError:
+            raise ValueError('%s is not a valid IPv4 address.' % value)
+        if v < 0 or v > 255:
+            raise ValueError('%s is not a valid IPv4 address.' % value)
+    return value
+
+def make_addrs(count):
+    r = random.Random(count)
+    return ['%d.%d.%d.%d' % (r.randint(1, 254), r.randint(0, 255),
+                             r.randint(0, 255), r.randint(1, 254))
+            for i in xrange(count)]
+
+def bench(count, repeat = 5):
+    addrs = make_addrs(count)
+    masks = ['255.255.255.0'] * count
+    cases = [
+        ('legacy per-string', lambda: [legacy_validate(a) for a in addrs]),
+        ('pack_addrs', lambda: network.pack_addrs(addrs)),
+        ('pack_addrs + pack_netmasks + broadcasts',
+         lambda: network.broadcasts(network.pack_addrs(addrs),
+                                    network.pack_netmasks(masks))),
+    ]
+    print '%d addresses, best of %d:' % (count, repeat)
+    for (name, func) in cases:
+        best = min(timeit.Timer(func).repeat(repeat, 1))
+        print '  %-42s %8.2f ms  %6.2f us/addr' % (name, best * 1e3,
+                                                   best * 1e6 / count)
+
+if __name__ == "__main__":
+    for count in [int(a) for a in sys.argv[1:]] or [1000, 10000, 100000]:
+        bench(count)
@@ -1,3 +1,5 @@
+import re
+
 class Field(object):
     """Fields implement constraints on ConfigObj instances, and rigidly define
     what is and is not exposed to an application. In almost every case, a Field
@@ -99,7 +101,7 @@ class Field(object):
 
         if value is None and not self._null:
             raise ValueError('%s cannot be null.'  % (str(self)))
-        if value is '' and not self._blank:
+        if value == '' and not self._blank:
             raise ValueError('%s cannot be blank.' % (str(self)))
 
         return value
@@ -111,6 +113,31 @@ class Field(object):
         val = instance.__dict__[self._name]
         if val is None: return None
         return str(val)
+
+    def _schema(self):
+        """Returns a JSON Schema fragment describing the values this Field
+        will accept. Subclasses should extend the dict returned by their
+        parent rather than building their own from scratch.
+
+        >>> class C(ConfigObj):
+        ...     field = Field(default = 'hi')
+        ...
+        >>> sorted(C.field._schema().items())
+        [('default', 'hi'), ('minLength', 1), ('type', 'string')]
+        """
+        schema = {'type': 'string'}
+        if self._null:
+            schema['type'] = ['string', 'null']
+        if not self._blank:
+            schema['minLength'] = 1
+        if self._default is not None:
+            schema['default'] = self._default
+        return schema
+
+    def _deserialize(self, value):
+        """Turns a JSON-compatible value, as produced by _serialize, back into
+        something validate() will accept. Most fields can use it as is."""
+        return value
         
     def __str__(self):
         return "%s.%s <class '%s" % (self._owner.__name__, self._name, 
@@ -195,6 +222,19 @@ class EnumField(Field):
             raise ValueError("Given value not equal to any valid choice.")
         return value
 
+    def _serialize(self, instance, owner):
+        # Choices needn't be strings, so keep them as they are; str() would
+        # break the round trip through validate().
+        return instance.__dict__[self._name]
+
+    def _schema(self):
+        schema = super(EnumField, self)._schema()
+        del schema['type'], schema['minLength']
+        schema['enum'] = list(self.choices)
+        if self._null:
+            schema['enum'].append(None)
+        return schema
+
 class ForeignObjField(Field):
     """References an instance of a ConfigObj class.
     
@@ -266,10 +306,8 @@ class ForeignObjField(Field):
     
         super(ForeignObjField, self).__init__(**kwargs)
 
-    def validate(self, value):
-        value = super(ForeignObjField, self).validate(value)
-        if value is None: return None
-        
+    def _resolve(self):
+        """Returns the foreign class, looking it up by name if necessary."""
         if not self.foreign_class:
             try:
                 fc = eval(self.fc_name, globals())
@@ -279,18 +317,35 @@ class ForeignObjField(Field):
                 raise TypeError("'%s' does not resolve to a ConfigObj class." %
                                 self.fc_name)
             self.foreign_class = fc
+        return self.foreign_class
+
+    def validate(self, value):
+        value = super(ForeignObjField, self).validate(value)
+        if value is None: return None
         
-        if not isinstance(value, self.foreign_class):
+        if not isinstance(value, self._resolve()):
             raise TypeError('%s is not an instance of %s.' % 
                             (value, self.foreign_class))
         
         return value
 
     def _serialize(self, instance, owner):
-        inst = self.__dict__[self._name]
+        inst = instance.__dict__[self._name]
         if inst is None: return None
         return inst.serialize()
 
+    def _schema(self):
+        # Nested inline; the same cycle caveat as serialize() applies.
+        schema = self._resolve().schema()
+        del schema['$schema']
+        if self._null:
+            schema['type'] = ['object', 'null']
+        return schema
+
+    def _deserialize(self, value):
+        if value is None: return None
+        return self._resolve().deserialize(value)
+
 #class TupleFieldMixIn(object):
 #    """Allows a field to store a tuple of the underlying types. Validator args
 #    are those of the underlying validator; the MixIn reads an extra arg called
@@ -352,10 +407,19 @@ class ConfigObj:
                     dict[k] = v
             return class_inst
     
+    @classmethod
+    def _class_fields(cls):
+        """Returns a dict of every Field bound to this class or its bases."""
+        fields = {}
+        for klass in reversed(cls.__mro__):
+            for (k, v) in klass.__dict__.items():
+                if isinstance(v, Field):
+                    fields[k] = v
+        return fields
+
     @property
     def _fields(self):
-        return ( (k, v) for k, v in type(self).__dict__.items() \
-                        if isinstance(v, Field) )
+        return type(self)._class_fields().iteritems()
 
     def __init__(self, **kwargs):
         """Creates an object. Initializes all field values to the default value
@@ -378,14 +442,204 @@ class ConfigObj:
                 
         ret = {}
 
-        for (name, field) in inst._fields:
-            ret[name] = field.serialze(self, type(self))
+        for (name, field) in self._fields:
+            ret[name] = field._serialize(self, type(self))
 
         return ret
 
+    @classmethod
+    def schema(cls):
+        """Returns a JSON Schema (draft 4) document describing what serialize()
+        produces and deserialize() accepts, as a JSON-compatible dict.
+
+        >>> class C1(ConfigObj):
+        ...     name = Field()
+        ...     mode = EnumField(('on', 'off'), default = 'off')
+        ...
+        >>> s = C1.schema()
+        >>> s['title'], s['type'], s['required']
+        ('C1', 'object', ['name'])
+        >>> s['properties']['mode']
+        {'default': 'off', 'enum': ['on', 'off']}
+
+        Foreign objects are described inline:
+        >>> class C2(ConfigObj):
+        ...     ref = ForeignObjField(C1, null = True)
+        ...
+        >>> s = C2.schema()['properties']['ref']
+        >>> s['title'], s['type']
+        ('C1', ['object', 'null'])
+        """
+        fields = cls._class_fields()
+        properties = {}
+        required = []
+        for name in sorted(fields):
+            field = fields[name]
+            properties[name] = field._schema()
+            if field.default is None and not field._null:
+                required.append(name)
+
+        schema = {'$schema': 'http://json-schema.org/draft-04/schema#',
+                  'title': cls.__name__,
+                  'type': 'object',
+                  'properties': properties,
+                  'additionalProperties': False}
+        if required:
+            schema['required'] = required
+        return schema
+
+    @classmethod
+    def deserialize(cls, data):
+        """Builds a validated instance from a dict, as produced by serialize()
+        or decoded from JSON. Missing fields take their defaults; a missing
+        field with neither a default nor null = True is an error, as is any
+        key that isn't a field.
+
+        >>> class C1(ConfigObj):
+        ...     name = Field()
+        ...     mode = EnumField(('on', 'off'), default = 'off')
+        ...
+        >>> c1 = C1.deserialize({'name': 'eth0'})
+        >>> c1.name, c1.mode
+        ('eth0', 'off')
+        >>> C1.deserialize(c1.serialize()).serialize() == c1.serialize()
+        True
+        >>> C1.deserialize({'mode': 'on'})
+        Traceback (most recent call last):
+            ...
+        ValueError: C1.name <class 'Field'> is required.
+        >>> C1.deserialize({'name': 'eth0', 'mode': 'auto'})
+        Traceback (most recent call last):
+            ...
+        ValueError: Given value not equal to any valid choice.
+        >>> C1.deserialize({'name': 'eth0', 'speed': 100})
+        Traceback (most recent call last):
+            ...
+        ValueError: Unrecognized fields for C1: speed
+
+        >>> class C2(ConfigObj):
+        ...     ref = ForeignObjField(C1)
+        ...
+        >>> C2.deserialize({'ref': {'name': 'wlan0'}}).ref.name
+        'wlan0'
+
+        Decoded JSON strings are unicode; they're stored as UTF-8 str, so
+        fields see the same values they would from serialize():
+        >>> try:
+        ...     import json
+        ... except ImportError:
+        ...     import simplejson as json
+        >>> C1.deserialize(json.loads('{"name": "eth0", "mode": "on"}')).name
+        'eth0'
+        >>> C1.deserialize(json.loads('{"name": ""}'))
+        Traceback (most recent call last):
+            ...
+        ValueError: C1.name <class 'Field'> cannot be blank.
+        """
+        # The decoder is generated once per class, on first use, so that
+        # bulk loads don't pay for the descriptor protocol on every field.
+        decoder = cls.__dict__.get('_decoder')
+        if decoder is None:
+            decoder = _make_decoder(cls)
+            setattr(cls, '_decoder', decoder)
+        return decoder(data)
+
     
     # Subclasses must also implement get() and save() for now.
 
+def _make_decoder(cls):
+    """Generates the function behind ConfigObj.deserialize for a class. Each
+    field becomes a couple of straight-line statements calling its validate()
+    directly and storing the result in the instance's __dict__. Unicode
+    strings, as decoded from JSON, are encoded to UTF-8 first."""
+    fields = cls._class_fields()
+    names = sorted(fields)
+    ns = {'new': object.__new__, 'cls': cls, 'missing': object()}
+
+    def unknown(data):
+        raise ValueError('Unrecognized fields for %s: %s' % (cls.__name__,
+                         ', '.join(sorted([str(k) for k in data
+                                           if k not in fields]))))
+    ns['unknown'] = unknown
+
+    lines = ['def decode(data):',
+             '    inst = new(cls)',
+             '    d = inst.__dict__',
+             '    found = 0']
+    for (i, name) in enumerate(names):
+        field = fields[name]
+        ns['validate%d' % i] = field.validate
+        ns['default%d' % i] = field.default
+        ns['field%d' % i] = field
+        lines.append('    v = data.get(%r, missing)' % name)
+        lines.append('    if v is missing:')
+        if field.default is None and not field._null:
+            lines.append("        raise ValueError('%%s is required.' %% "
+                         "field%d)" % i)
+        else:
+            lines.append('        d[%r] = default%d' % (name, i))
+        lines.append('    else:')
+        lines.append('        found += 1')
+        lines.append('        if type(v) is unicode:')
+        lines.append("            v = v.encode('utf-8')")
+        if type(field)._deserialize.im_func is Field._deserialize.im_func:
+            lines.append('        d[%r] = validate%d(v)' % (name, i))
+        else:
+            ns['load%d' % i] = field._deserialize
+            lines.append('        d[%r] = validate%d(load%d(v))' %
+                         (name, i, i))
+    lines.append('    if found != len(data):')
+    lines.append('        unknown(data)')
+    lines.append('    return inst')
+
+    exec '\n'.join(lines) + '\n' in ns
+    return ns['decode']
+
+def _schema_accepts(schema, value):
+    """Checks a value against a schema fragment from Field._schema(). Only
+    the keywords _schema() uses are understood; the doctests use this to
+    keep schemas in line with validate().
+
+    >>> s = {'type': ['string', 'null'], 'minLength': 1, 'pattern': '^a+$'}
+    >>> [_schema_accepts(s, v) for v in ('aa', 'ab', '', None, 1)]
+    [True, False, False, True, False]
+    >>> _schema_accepts({'enum': ['on', 'off']}, 'on')
+    True
+    """
+    types = schema.get('type')
+    if types is not None:
+        if not isinstance(types, list): types = [types]
+        kinds = {'string': basestring, 'null': type(None), 'object': dict}
+        if not [t for t in types if isinstance(value, kinds[t])]:
+            return False
+    if 'enum' in schema and value not in schema['enum']:
+        return False
+    if isinstance(value, basestring):
+        if len(value) < schema.get('minLength', 0):
+            return False
+        if 'pattern' in schema and not re.search(schema['pattern'], value):
+            return False
+    return True
+
+def _schema_agrees(field, value):
+    """True if field's schema and its validate() agree on value.
+
+    >>> class C(ConfigObj):
+    ...     name = Field(null = True)
+    ...     mode = EnumField(('on', 'off'))
+    ...
+    >>> [v for v in ('eth0', '', None) if not _schema_agrees(C.name, v)]
+    []
+    >>> [v for v in ('on', 'x', None) if not _schema_agrees(C.mode, v)]
+    []
+    """
+    try:
+        field.validate(value)
+        valid = True
+    except ValueError:
+        valid = False
+    return valid == _schema_accepts(field._schema(), value)
+
 if __name__ == "__main__":
     import doctest
     doctest.testmod(optionflags = doctest.ELLIPSIS |
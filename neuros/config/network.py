@@ -1,9 +1,148 @@
 #!/usr/bin/env python
 
+import socket
+import struct
+from array import array
+
 import configobj
 
+# Packed address helpers. Addresses are handled as unsigned 32-bit ints in
+# host order, held in array('I') so that bulk imports (DHCP leases, static
+# host lists) stay compact and can be checked in a single pass.
+
+_ALL_ONES = 0xffffffff
+
+# Every valid netmask, mapped to its prefix length. A mask is contiguous if
+# and only if it appears here.
+_PREFIXES = dict([((_ALL_ONES << (32 - n)) & _ALL_ONES, n) for n in range(33)])
+
+def pack_addrs(values):
+    """Validates an iterable of dotted-decimal IPv4 addresses in one pass and
+    returns them packed into an array of 32-bit ints. CIDR suffixes are
+    discarded, as with IPv4Addr.
+
+    >>> list(pack_addrs(['192.168.0.1', '10.0.0.1/8']))
+    [3232235521L, 167772161L]
+    >>> pack_addrs(['192.168.0.1', '123.456.78.9'])
+    Traceback (most recent call last):
+        ...
+    ValueError: 123.456.78.9 is not a valid IPv4 address.
+    >>> pack_addrs(['192.168.0.1', None])
+    Traceback (most recent call last):
+        ...
+    ValueError: None is not a valid IPv4 address.
+    >>> pack_addrs([3232235521])
+    Traceback (most recent call last):
+        ...
+    ValueError: 3232235521 is not a valid IPv4 address.
+    """
+    values = list(values)
+    try:
+        addrs = [v.split('/', 1)[0] for v in values]
+        packed = ''.join([socket.inet_pton(socket.AF_INET, a) for a in addrs])
+    except (socket.error, TypeError, AttributeError):
+        # Go back and find the culprit; this only happens on failure, so the
+        # common case never pays for it.
+        for v in values:
+            try:
+                socket.inet_pton(socket.AF_INET, v.split('/', 1)[0])
+            except (socket.error, TypeError, AttributeError):
+                raise ValueError('%s is not a valid IPv4 address.' % (v,))
+        raise
+    return array('I', struct.unpack('!%dI' % len(addrs), packed))
+
+def unpack_addrs(addrs):
+    """Turns packed addresses back into dotted-decimal strings.
+
+    >>> unpack_addrs(pack_addrs(['192.168.0.1', '0.0.0.0']))
+    ['192.168.0.1', '0.0.0.0']
+    """
+    packed = struct.pack('!%dI' % len(addrs), *addrs)
+    return [socket.inet_ntoa(packed[i:i + 4])
+            for i in range(0, len(packed), 4)]
+
+def pack_netmasks(values):
+    """Like pack_addrs, but additionally requires each address to be a
+    contiguous netmask.
+
+    >>> list(pack_netmasks(['255.255.255.0', '0.0.0.0']))
+    [4294967040L, 0L]
+    >>> pack_netmasks(['255.255.255.0', '255.0.255.0'])
+    Traceback (most recent call last):
+        ...
+    ValueError: 255.0.255.0 is not a valid IPv4 netmask.
+    """
+    masks = pack_addrs(values)
+    for m in masks:
+        if m not in _PREFIXES:
+            raise ValueError('%s is not a valid IPv4 netmask.' %
+                             unpack_addrs([m])[0])
+    return masks
+
+def prefix_to_netmask(prefix):
+    """Returns the packed netmask for a CIDR prefix length.
+
+    >>> unpack_addrs([prefix_to_netmask(20)])
+    ['255.255.240.0']
+    """
+    prefix = int(prefix)
+    if prefix < 0 or prefix > 32:
+        raise ValueError('%d is not a valid CIDR prefix length.' % prefix)
+    return (_ALL_ONES << (32 - prefix)) & _ALL_ONES
+
+def netmask_to_prefix(mask):
+    """Returns the CIDR prefix length of a packed netmask.
+
+    >>> netmask_to_prefix(pack_netmasks(['255.255.255.128'])[0])
+    25
+    """
+    try:
+        return _PREFIXES[mask]
+    except KeyError:
+        raise ValueError('%s is not a valid IPv4 netmask.' %
+                         unpack_addrs([mask])[0])
+
+def parse_cidr(value):
+    """Splits 'address/prefix' into a packed address and packed netmask. A
+    bare address is treated as a /32.
+
+    >>> unpack_addrs(parse_cidr('10.1.2.3/16'))
+    ['10.1.2.3', '255.255.0.0']
+    >>> parse_cidr('10.1.2.3/33')
+    Traceback (most recent call last):
+        ...
+    ValueError: 33 is not a valid CIDR prefix length.
+    """
+    addr, sep, prefix = value.partition('/')
+    if not sep:
+        prefix = 32
+    elif not prefix.isdigit():
+        raise ValueError('%s is not a valid CIDR prefix length.' % prefix)
+    return (pack_addrs([addr])[0], prefix_to_netmask(prefix))
+
+def broadcasts(addrs, masks):
+    """Derives the broadcast address for each packed address and netmask
+    pair, returning a new packed array.
+
+    >>> a = pack_addrs(['192.168.0.17', '10.1.2.3'])
+    >>> m = pack_netmasks(['255.255.255.0', '255.0.0.0'])
+    >>> unpack_addrs(broadcasts(a, m))
+    ['192.168.0.255', '10.255.255.255']
+    >>> broadcasts(a, m[:1])
+    Traceback (most recent call last):
+        ...
+    ValueError: 2 addresses but 1 netmasks.
+    """
+    if len(addrs) != len(masks):
+        raise ValueError('%d addresses but %d netmasks.' %
+                         (len(addrs), len(masks)))
+    return array('I', [a | (~m & _ALL_ONES) for (a, m) in zip(addrs, masks)])
+
 # Fields used below. These may be moved to configobj proper
 
+_OCTET = '(25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9]?[0-9])'
+_PREFIX_LENGTHS = [str(n) for n in range(33)]
+
 class IPv4Addr(configobj.Field):
     """Validates an IPv4 address, discarding CIDR suffix if present.
 
@@ -31,48 +170,140 @@ class IPv4Addr(configobj.Field):
     Traceback (most recent call last):
         ...
     ValueError: 123.456.78.9 is not a valid IPv4 address.
+
+    >>> c.addr = '01.2.3.4'
+    Traceback (most recent call last):
+        ...
+    ValueError: 01.2.3.4 is not a valid IPv4 address.
+    >>> c.addr = '10.0.0.1/33'
+    Traceback (most recent call last):
+        ...
+    ValueError: 10.0.0.1/33 is not a valid IPv4 address.
+
+    The schema accepts exactly what validate() does, blank or not:
+    >>> class B(configobj.ConfigObj):
+    ...     addr = IPv4Addr(blank = True)
+    ...
+    >>> values = ['192.168.0.1', '127.0.0.1/0', '10.0.0.1/32', '', None, 4,
+    ...           '123.456.78.9', '01.2.3.4', '1.2.3', '10.0.0.1/33',
+    ...           '10.0.0.1/08', '10.0.0.1/x']
+    >>> [v for v in values if not configobj._schema_agrees(C.addr, v)]
+    []
+    >>> [v for v in values if not configobj._schema_agrees(B.addr, v)]
+    []
     """
 
     def validate(self, value):
         value = super(IPv4Addr, self).validate(value)
-        if value is None or value is '': return value
+        if value is None or value == '': return value
 
         if not isinstance(value, str):
             # For now, we don't support integer addresses to avoid confusion
             raise ValueError('Only dotted-decimal IPv4 addresses supported.')
 
-        if value.find('/') >= 0:
-            value = value.split('/')[0]
-
-        parts = value.split('.')
-        if len(parts) != 4:
+        addr, slash, prefix = value.partition('/')
+        if slash and prefix not in _PREFIX_LENGTHS:
             raise ValueError('%s is not a valid IPv4 address.' % value)
-        
-        for part in parts:
-            try:
-                v = int(part)
-            except ValueError:
-                raise ValueError('%s is not a valid IPv4 address.' % value)
-            if v < 0 or v > 255:
-                raise ValueError('%s is not a valid IPv4 address.' % value)
-        return value
+        pack_addrs([addr])
+        return addr
+
+    def _schema(self):
+        schema = super(IPv4Addr, self)._schema()
+        # Dotted-decimal without leading zeros, which inet_pton refuses
+        schema['pattern'] = self._pattern('(%s\\.){3}%s' % (_OCTET, _OCTET))
+        return schema
+
+    def _pattern(self, addr):
+        # Adds the optional CIDR suffix validate() discards, and for blank
+        # fields the empty string
+        pattern = '%s(/(%s))?' % (addr, '|'.join(_PREFIX_LENGTHS))
+        if self._blank:
+            pattern = '(%s)?' % pattern
+        return '^%s$' % pattern
 
 class IPv4Netmask(IPv4Addr):
-    """Validates an IPv4 netmask. Doesn't really do anything in particular at
-    this point to differentiate itself from IPv4Addr, but it will."""
+    """Validates an IPv4 netmask, which must be contiguous.
+
+    >>> class C(configobj.ConfigObj):
+    ...     mask = IPv4Netmask(default = '255.255.255.0')
+    ...
+    >>> c = C()
+    >>> print c.mask
+    255.255.255.0
+    >>> c.mask = '255.255.0.0'
+    >>> print c.mask
+    255.255.0.0
+    >>> c.mask = '255.0.255.0'
+    Traceback (most recent call last):
+        ...
+    ValueError: 255.0.255.0 is not a valid IPv4 netmask.
+
+    Its schema lists the 33 valid masks, and accepts what validate() does:
+    >>> values = ['255.255.255.0', '0.0.0.0', '255.255.255.0/24', None, '',
+    ...           '255.0.255.0', '255.255.255.1', '255.255.255.0/33']
+    >>> [v for v in values if not configobj._schema_agrees(C.mask, v)]
+    []
+    """
 
     def validate(self, value):
         value = super(IPv4Netmask, self).validate(value)
+        if value is None or value == '': return value
 
+        pack_netmasks([value])
+        return value
+
+    def _schema(self):
+        schema = super(IPv4Netmask, self)._schema()
+        masks = unpack_addrs(sorted(_PREFIXES))
+        masks = [m.replace('.', '\\.') for m in masks]
+        schema['pattern'] = self._pattern('(%s)' % '|'.join(masks))
+        return schema
 
 
 # The actual ConfigObjs, which do the validating of IO as well as other stuff
 
 class IPv4Config(configobj.ConfigObj):
+    """IPv4 settings for a single interface.
+
+    >>> c = IPv4Config()
+    >>> c.address = '192.168.1.20'
+    >>> c.derive_broadcast()
+    '192.168.1.255'
+    >>> c.broadcast
+    '192.168.1.255'
+    >>> IPv4Config().derive_broadcast()
+    Traceback (most recent call last):
+        ...
+    ValueError: IPv4Config needs an address and netmask to derive broadcast.
+
+    Settings uploaded as JSON are validated like any others:
+    >>> try:
+    ...     import json
+    ... except ImportError:
+    ...     import simplejson as json
+    >>> c = IPv4Config.deserialize(json.loads(json.dumps(c.serialize())))
+    >>> c.address, c.netmask, c.gw
+    ('192.168.1.20', '255.255.255.0', None)
+    >>> IPv4Config.deserialize(json.loads('{"address": "192.168.1.300", '
+    ...                                   '"broadcast": ""}'))
+    Traceback (most recent call last):
+        ...
+    ValueError: 192.168.1.300 is not a valid IPv4 address.
+    """
     address = IPv4Addr()
     netmask = IPv4Netmask(default = '255.255.255.0')
     broadcast = IPv4Addr()
     gw = IPv4Addr(null = True)
+
+    def derive_broadcast(self):
+        """Sets broadcast from address and netmask, and returns it."""
+        if not self.address or not self.netmask:
+            raise ValueError('IPv4Config needs an address and netmask to '
+                             'derive broadcast.')
+        addrs = pack_addrs([self.address])
+        masks = pack_netmasks([self.netmask])
+        self.broadcast = unpack_addrs(broadcasts(addrs, masks))[0]
+        return self.broadcast
     
 class Inteface(configobj.ConfigObj):
     pass
@@ -106,10 +337,6 @@ class ENIParser:
         
 
 
-class IPv4Config(configobj.ConfigObj):
-    pass
-    
-
 class Interface(configobj.ConfigObj):
     """Controls network interfaces, including IP configuration and link
     status."""